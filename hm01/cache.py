@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+from typing import Any, Optional
+
+import numpy as np
+
+# (VR) Fraction of the size bound the store is brought back to when it overflows, so that it is not evicted on every write
+EVICTION_TARGET = 0.9
+# (VR) Number of writes of a process between two checks of the size of the store
+EVICTION_INTERVAL = 256
+
+
+class ResultCache:
+    """ (VR) Persistent content-addressed store of mincut and recluster results, shared by all runs and workers
+
+    Entries are keyed by a hash of the graph fingerprint, the kind of result, its parameters and
+    the sorted node set of the cluster, so a cluster that comes up again in another run (another
+    threshold, another input clustering) is looked up whatever its name. The store is a SQLite
+    database in WAL mode, which serializes the writers of the pool workers, and is bounded in
+    size by evicting the least recently used entries.
+
+    Each process opens its own connection on first use (a connection inherited through fork is
+    never used), so the cache can be handed to the workers.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, namespace: str):
+        self.path = os.path.join(cache_dir, "hm01_cache.sqlite")
+        self.max_bytes = max_bytes
+        self.namespace = namespace
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = os.getpid()
+        self._writes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        state["_writes"] = 0
+        return state
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._writes = 0
+            self._conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+        return self._conn
+
+    def key(self, kind: str, params: str, graph) -> str:
+        """ (VR) Key of a result of the given kind and parameters on the node set of `graph` """
+        nodes = np.sort(np.fromiter(graph.nodes(), dtype=np.int64))
+        digest = hashlib.sha256()
+        digest.update(f"{self.namespace}\0{kind}\0{params}\0".encode("utf-8"))
+        digest.update(nodes.tobytes())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self.conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.conn.execute("UPDATE entries SET used = ? WHERE key = ?", (time.time(), key))
+        return pickle.loads(row[0])
+
+    def put(self, key: str, value: Any):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        self.conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, size, used) VALUES (?, ?, ?, ?)",
+            (key, blob, len(blob), time.time()),
+        )
+        self._writes += 1
+        if self._writes % EVICTION_INTERVAL == 0:
+            self.evict()
+
+    def evict(self):
+        """ (VR) Drop the least recently used entries while the store is above its size bound """
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = total - EVICTION_TARGET * self.max_bytes
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            freed = 0
+            stale = []
+            for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY used"):
+                if freed >= target:
+                    break
+                stale.append((key,))
+                freed += size
+            self.conn.executemany("DELETE FROM entries WHERE key = ?", stale)
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import os
+import pickle
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from hm01.context import context
+
+
+class Checkpointer:
+    """ (VR) Incremental checkpoints of the worker results merged by the master
+
+    Every result (tree nodes, cluster id updates, children and timings of a batch) is buffered
+    as it is merged, and every `interval` seconds the buffer is handed to a writer thread that
+    pickles it into the next numbered file of the checkpoint directory, so neither the workers
+    nor the master wait on the disk. The first file holds the parameters of the run that change its
+    results (the threshold, network, clusterer and input clustering, the CM options and the mincut
+    configuration), so that a run is only resumed with the same ones.
+
+    On resume, the results are replayed through the same merge as live ones, and only the
+    clusters without a result are dispatched again.
+    """
+
+    def __init__(self, subdir: str, interval: float, meta: Dict[str, Any]):
+        self.subdir = subdir
+        self.interval = interval
+        self.meta = meta
+        self._buffer: List[Any] = []
+        self._last = time.monotonic()
+        self._seq = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def directory(self) -> str:
+        path = context.request_subpath(self.subdir)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def start(self, resume: bool) -> List[Any]:
+        """ (VR) Start checkpointing, returns the results of the previous run to replay if resuming """
+        files = context.find_checkpoints(self.subdir)
+        restored: List[Any] = []
+        if resume and files:
+            with open(files[0], "rb") as f:
+                meta = pickle.load(f)
+            assert meta == self.meta, f"Cannot resume a run with other parameters ({meta} != {self.meta})"
+            for path in files[1:]:
+                with open(path, "rb") as f:
+                    restored.extend(pickle.load(f))
+            self._seq = len(files)
+        else:
+            for path in files:
+                os.remove(path)
+            self._write(self.meta)
+
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+        return restored
+
+    def record(self, result: Any):
+        """ (VR) Buffer a merged result, and hand the buffer to the writer if the interval is over """
+        self._buffer.append(result)
+        if time.monotonic() - self._last >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._queue.put(self._buffer)
+            self._buffer = []
+        self._last = time.monotonic()
+
+    def close(self):
+        """ (VR) Write what is left and wait for the writer """
+        self.flush()
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _write_loop(self):
+        while True:
+            results = self._queue.get()
+            if results is None:
+                return
+            self._write(results)
+
+    def _write(self, obj: Any):
+        # (VR) Written under a temporary name first, so that a crash never leaves a truncated checkpoint
+        path = os.path.join(self.directory, f"checkpoint_{self._seq:08d}.pkl")
+        self._seq += 1
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
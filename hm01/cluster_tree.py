@@ -12,4 +12,5 @@ class ClusterTreeNode(Node):
     num_nodes: int
     cut_size: Optional[int]
     validity_threshold: Optional[float]
+    mincut_algorithm: Optional[str]         # How the cut was found (VieCut algorithm, closed form, components, ...)
     cm_valid: bool                          # Def CM Valid: The cluster need not be operated on by CM anymore (Note: Every extant cluster is also CM Valid)
\ No newline at end of file
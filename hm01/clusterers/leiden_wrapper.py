@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Dict, Iterator, List, Union
+from typing import Dict, Iterator, List, Optional, Union
 from hm01.graph import Graph, IntangibleSubgraph, RealizedSubgraph
 from hm01.clusterers.abstract_clusterer import AbstractClusterer
 from enum import Enum
@@ -15,15 +15,30 @@ class Quality(str, Enum):
 class LeidenClusterer(AbstractClusterer):
     resolution: float
     quality: Quality = Quality.cpm
+    n_iterations: int = 2               # (VR) Negative to iterate until an iteration does not improve the partition
+    seed: Optional[int] = None
 
     def cluster(self, graph: Union[Graph, RealizedSubgraph]) -> Iterator[IntangibleSubgraph]:
+        """Returns a list of (labeled) subgraphs on the graph
+
+        (VR) Same as leidenalg's find_partition, except that a cluster being reclustered (a realized
+        subgraph) is optimised one iteration at a time and stops as soon as an iteration does not
+        improve its partition, instead of always running all the iterations
+        """
         g = graph.to_igraph()
         if self.quality == Quality.cpm:
-            partition = la.find_partition(
-                g, la.CPMVertexPartition, resolution_parameter=self.resolution
-            )
+            partition = la.CPMVertexPartition(g, resolution_parameter=self.resolution)
+        else:
+            partition = la.ModularityVertexPartition(g)
+        optimiser = la.Optimiser()
+        if self.seed is not None:
+            optimiser.set_rng_seed(self.seed)
+        if isinstance(graph, RealizedSubgraph) and self.n_iterations > 0:
+            for _ in range(self.n_iterations):
+                if optimiser.optimise_partition(partition, n_iterations=1) <= 0:
+                    break
         else:
-            partition = la.find_partition(g, la.ModularityVertexPartition)
+            optimiser.optimise_partition(partition, n_iterations=self.n_iterations)
         for i in range(len(partition)):
             nodes = partition[i]
             yield graph.intangible_subgraph_from_compact(nodes, f"{i+1}")
@@ -5,10 +5,16 @@
 """The main CLI logic, containing also the main algorithm"""
 from __future__ import annotations
 
+import atexit
 import importlib
 import json
+import math
 import multiprocessing as mp
+import os
+import queue
+import shutil
 import sys
+import tempfile
 import time
 from enum import Enum
 from typing import Dict, List, Optional, Tuple, Union, cast
@@ -19,15 +25,22 @@ import jsonpickle
 import networkit as nk
 import treeswift as ts
 import typer
+from hm01.cache import ResultCache
+from hm01.checkpoint import Checkpointer
 from hm01.cluster_tree import ClusterTreeNode
 from hm01.clusterers.ikc_wrapper import IkcClusterer
 from hm01.clusterers.leiden_wrapper import LeidenClusterer, Quality
 # (VR) Change: I removed the context import since we do everything in memory
 # (VR) Change 2: I brought back context just for IKC
+from hm01.connectivity import connected_components, minimum_cut_atoms, two_edge_connected_components
 from hm01.context import context
-from hm01.graph import Graph, IntangibleSubgraph, RealizedSubgraph
+from hm01.cost_model import CostModel, batch_by_cost, longest_first, predict_makespan
+from hm01.graph import CSRGraph, Graph, IntangibleSubgraph, RealizedSubgraph
+from hm01.kecc import k_edge_connected_components
+from hm01.mincut import ALGORITHMS, QUEUES, MincutConfig
+import hm01.mincut as mincut
 from hm01.mincut_requirement import MincutRequirement
-from hm01.pruner import prune_graph
+from hm01.pruner import prune_clusters, prune_graph
 from structlog import get_logger
 from enum import Enum
 
@@ -35,6 +48,12 @@ from enum import Enum
 # from to_universal import cm2universal
 
 
+class CMMode(str, Enum):
+    """ (VR) How CM splits the clusters that are not well-connected """
+    recursive = "recursive"     # (VR) Cut at the mincut and recluster the sides, one cut at a time
+    kecc = "kecc"               # (VR) Split into the maximal k-edge-connected subgraphs, then recluster them
+
+
 class ClustererSpec(str, Enum):
     """ (VR) Container for Clusterer Specification """
     leiden = "leiden"
@@ -111,39 +130,207 @@ def initialize_subgraph(
     return subgraph, node_set
 
 
-def par_task(stack, node_mapping, node2cids):
-    # (VR) Main algorithm loop: Recursively cut clusters in stack until they have mincut above threshold
-    while stack:
-        if not quiet_g:
-            log = get_logger()
-            log.debug("entered next iteration of loop", queue_size=len(stack))
-        
-        # (VR) Get the next cluster to operate on
-        intangible_subgraph = stack.pop()
-        if not quiet_g:
-            log.debug(
-                "popped graph",
-                graph_n=intangible_subgraph.n(),
-                graph_index=intangible_subgraph.index,
-            )
+def init_worker(graph_handle, clusterer_, clusterer_source, requirement_, quiet, split_bridges, mode, certificate,
+                mincut_config, all_mincuts, cache):
+    """ (VR) Set the globals of a pool worker
 
-        # (VR) Mark nodes in popped cluster with their respective cluster ID
-        update_cid_membership(intangible_subgraph, node2cids)
+    The global graph is attached from shared memory unless it was inherited through fork.
+    External clusterers are loaded again from their file when they could not be pickled.
+    """
+    global global_graph
+    global clusterer
+    global requirement
+    global quiet_g
+    global split_bridges_g
+    global mode_g
+    global certificate_g
+    global all_mincuts_g
+    global cache_g
+
+    if getattr(globals().get("global_graph"), "handle", None) != graph_handle:
+        global_graph = CSRGraph.from_shared_memory(graph_handle)
+    clusterer = clusterer_ if clusterer_ is not None else load_clusterer(*clusterer_source)
+    requirement = requirement_
+    quiet_g = quiet
+    split_bridges_g = split_bridges
+    mode_g = mode
+    certificate_g = certificate
+    mincut.config = mincut_config
+    all_mincuts_g = all_mincuts
+    cache_g = cache
+
+
+def graft_tree_nodes(
+    node_mapping: Dict[str, ClusterTreeNode],
+    mapping: Dict[str, ClusterTreeNode],
+):
+    """ (VR) Merge the tree nodes returned by a worker into the master tree
 
-        # (VR) If the current cluster is a singleton or empty, move on
-        if intangible_subgraph.n() <= 1:
+    The worker builds a fresh node for every cluster it popped. If the master already
+    holds a node for that cluster, the worker's results are copied onto it and its
+    children are re-attached there, so the master tree stays connected.
+    """
+    for index, node in mapping.items():
+        existing = node_mapping.get(index)
+        if existing is None or existing is node:
+            node_mapping[index] = node
             continue
-        
-        # (VR) Realize the set of nodes contained by the graph (i.e. construct its adjacency list)
-        if isinstance(intangible_subgraph, IntangibleSubgraph):
-            subgraph = intangible_subgraph.realize(global_graph)
-        else:
-            subgraph = intangible_subgraph
+        existing.extant = existing.extant and node.extant
+        existing.cm_valid = node.cm_valid
+        for attr in ("cut_size", "validity_threshold", "mincut_algorithm"):
+            if hasattr(node, attr):
+                setattr(existing, attr, getattr(node, attr))
+        for child in list(node.children):
+            existing.add_child(child)
+
+
+def par_task(batch):
+    """ (VR) Process one round of prune/mincut/split/recluster for each cluster in the batch
+
+    Returns the tree nodes created, the node to cluster id updates, the reclustered
+    children that still need to be processed and the time spent on each cluster. The
+    children are handed back to the master, already realized in their own local CSR, so that
+    any idle worker can pick them up.
+
+    The clusters are prepared one by one, but the mincuts of those small enough to be cut in
+    process are computed together once the whole batch is prepared, and the time of that
+    call is shared among them.
+    """
+    node_mapping: Dict[str, ClusterTreeNode] = {}
+    node2cids: Dict[int, str] = {}
+    stack: List[RealizedSubgraph] = []
+    elapsed: Dict[str, float] = {}
+    batched = []
+
+    for intangible_subgraph in batch:
+        start = time.perf_counter()
+        prepared = prepare_cluster(intangible_subgraph, node_mapping, node2cids, stack)
+        if prepared is not None:
+            _, subgraph, valid_threshold = prepared
+            threshold = valid_threshold if certificate_g else None
+            key = mincut_key(subgraph, threshold)
+            mincut_res = cache_g.get(key) if key else None
+            if mincut_res is None and mincut.config.select(subgraph.n(), subgraph.m()) == mincut.STOER_WAGNER:
+                batched.append((intangible_subgraph.index, prepared, key))
+            else:
+                if mincut_res is None:
+                    mincut_res = subgraph.find_mincut(threshold)
+                    if key:
+                        cache_g.put(key, mincut_res)
+                finish_cluster(*prepared, mincut_res, node_mapping, stack)
+        elapsed[intangible_subgraph.index] = time.perf_counter() - start
+
+    if batched:
+        start = time.perf_counter()
+        mincuts = mincut.batch_mincut([subgraph for _, (_, subgraph, _), _ in batched])
+        share = (time.perf_counter() - start) / len(batched)
+        for (index, prepared, key), mincut_res in zip(batched, mincuts):
+            start = time.perf_counter()
+            if key:
+                cache_g.put(key, mincut_res)
+            finish_cluster(*prepared, mincut_res, node_mapping, stack)
+            elapsed[index] += share + time.perf_counter() - start
+
+    return node_mapping, node2cids, stack, elapsed
+
+
+def mincut_key(subgraph: RealizedSubgraph, threshold: Optional[float]) -> Optional[str]:
+    """ (VR) Cache key of the mincut of a cluster, None without a cache """
+    if cache_g is None:
+        return None
+    return cache_g.key("mincut", f"{mincut.config}|{threshold}", subgraph)
+
+
+def recluster(graph: RealizedSubgraph) -> List[IntangibleSubgraph]:
+    """ (VR) Non-singleton clusters of a partition, through the result cache if any
+
+    The clusters are cached by their suffix, as the same node set can come up under another name
+    """
+    if cache_g is None:
+        return list(clusterer.cluster_without_singletons(graph))
+    key = cache_g.key("recluster", repr(clusterer), graph)
+    clusters = cache_g.get(key)
+    if clusters is None:
+        clusters = [
+            (cluster.index[len(graph.index):], cluster.subset)
+            for cluster in clusterer.cluster_without_singletons(graph)
+        ]
+        cache_g.put(key, clusters)
+    return [IntangibleSubgraph(subset, graph.index + suffix) for suffix, subset in clusters]
+
+
+def prepare_cluster(
+    intangible_subgraph: IntangibleSubgraph,
+    node_mapping: Dict[str, ClusterTreeNode],
+    node2cids: Dict[int, str],
+    stack: List[RealizedSubgraph],
+) -> Optional[Tuple[ClusterTreeNode, RealizedSubgraph, float]]:
+    """ (VR) Prune a single cluster and split it without a mincut when possible, pushing the new clusters onto the stack
+
+    Returns: the tree node, the subgraph and the validity threshold of a cluster that still needs
+    its mincut, or None if the cluster is done
+    """
+    if not quiet_g:
+        log = get_logger()
+        log.debug(
+            "popped graph",
+            graph_n=intangible_subgraph.n(),
+            graph_index=intangible_subgraph.index,
+        )
 
-        # (VR) Get the current cluster tree node
-        tree_node = node_mapping[subgraph.index]
+    # (VR) Mark nodes in popped cluster with their respective cluster ID
+    update_cid_membership(intangible_subgraph, node2cids)
+
+    # (VR) If the current cluster is a singleton or empty, move on
+    if intangible_subgraph.n() <= 1:
+        return
+    
+    # (VR) Create the cluster tree node, the master merges it into its own copy
+    tree_node = ClusterTreeNode()
+    annotate_tree_node(tree_node, intangible_subgraph)
+    tree_node.extant = True
+    node_mapping[intangible_subgraph.index] = tree_node
+
+    # (VR) Realize the set of nodes contained by the graph (i.e. construct its adjacency list)
+    if isinstance(intangible_subgraph, IntangibleSubgraph):
+        subgraph = intangible_subgraph.realize(global_graph)
+    else:
+        subgraph = intangible_subgraph
+
+    # (VR) Log current cluster data after realization
+    if not quiet_g:
+        log = log.bind(
+            g_id=subgraph.index,
+            g_n=subgraph.n(),
+            g_m=subgraph.m(),
+            g_mcd=subgraph.mcd(),
+        )
+    
+    # (VR) Get minimum node degree in current cluster
+    original_mcd = subgraph.mcd()
+
+    # (VR) Pruning: Remove singletons with node degree under threshold until there exists none
+    num_pruned = prune_graph(subgraph, requirement, clusterer)
+
+    # if subgraph.n() <= 1:
+    #     # somehow all nodes have been pruned away and the graph is empty or has one node
+    #     tree_node.cut_size = 0
+    #     tree_node.extant = False
+    #     tree_node.valid = False
+    #     tree_node.validity_threshold = 0
+    #     continue
+
+    if subgraph.n() == 0:
+        tree_node.cut_size = 0
+        tree_node.extant = False
+        return
+
+    if num_pruned > 0:
+        # (VR) Set the cluster cut size to the degree of the removed node
+        tree_node.cut_size = original_mcd
+        tree_node.extant = False                        # (VR) Change: The current cluster has been changed, so its not extant or CM valid anymore
+        tree_node.cm_valid = False
 
-        # (VR) Log current cluster data after realization
         if not quiet_g:
             log = log.bind(
                 g_id=subgraph.index,
@@ -151,115 +338,201 @@ def par_task(stack, node_mapping, node2cids):
                 g_m=subgraph.m(),
                 g_mcd=subgraph.mcd(),
             )
-        
-        # (VR) Get minimum node degree in current cluster
-        original_mcd = subgraph.mcd()
-
-        # (VR) Pruning: Remove singletons with node degree under threshold until there exists none
-        num_pruned = prune_graph(subgraph, requirement, clusterer)
-
-        # if subgraph.n() <= 1:
-        #     # somehow all nodes have been pruned away and the graph is empty or has one node
-        #     tree_node.cut_size = 0
-        #     tree_node.extant = False
-        #     tree_node.valid = False
-        #     tree_node.validity_threshold = 0
-        #     continue
-
-        if subgraph.n() == 0:
-            tree_node.cut_size = 0
+            log.info("pruned graph", num_pruned=num_pruned)
+
+        # (VR) Create a TreeNodeCluster for the pruned cluster and set it as the current node's child
+        new_child = ClusterTreeNode()
+        subgraph.index = f"{subgraph.index}δ"
+        annotate_tree_node(new_child, subgraph)
+        tree_node.add_child(new_child)
+        node_mapping[subgraph.index] = new_child
+
+        # (VR) Iterate to the new node
+        tree_node = new_child
+        update_cid_membership(subgraph, node2cids)
+
+    # (VR) A disconnected cluster is split into all of its components at once, with a cut of size 0
+    num_components, labels = connected_components(subgraph)
+    if num_components > 1:
+        tree_node.cut_size = 0
+        tree_node.mincut_algorithm = "components"
+        tree_node.validity_threshold = requirement.validity_threshold(clusterer, subgraph)
+        tree_node.cm_valid = False
+        tree_node.extant = False
+        split_cluster(tree_node, subgraph.split_by_labels(labels, num_components), node_mapping, stack)
+        if not quiet_g:
+            log.info("cluster split into components", num_components=num_components)
+        return
+
+    # (VR) Optionally split a cluster along all of its bridges at once, each of them being a cut of size 1,
+    # when that matches cutting them one at a time (see `cut_in_every_part`)
+    if split_bridges_g:
+        num_parts, labels = two_edge_connected_components(subgraph)
+        partitions = subgraph.split_by_labels(labels, num_parts) if num_parts > 1 else []
+        if partitions and cut_in_every_part(partitions, 1):
+            tree_node.cut_size = 1
+            tree_node.mincut_algorithm = "bridges"
+            tree_node.validity_threshold = requirement.validity_threshold(clusterer, subgraph)
+            tree_node.cm_valid = False
             tree_node.extant = False
-            continue
+            split_cluster(tree_node, partitions, node_mapping, stack)
+            if not quiet_g:
+                log.info("cluster split along bridges", num_parts=num_parts)
+            return
 
-        if num_pruned > 0:
-            # (VR) Set the cluster cut size to the degree of the removed node
-            tree_node.cut_size = original_mcd
-            tree_node.extant = False                        # (VR) Change: The current cluster has been changed, so its not extant or CM valid anymore
+    # (VR) In k-ECC mode, the cluster is directly split into its maximal subgraphs with a mincut above the threshold
+    if mode_g == CMMode.kecc:
+        valid_threshold = requirement.validity_threshold(clusterer, subgraph)
+        pieces, cut_size = k_edge_connected_components(subgraph, math.floor(valid_threshold) + 1)
+        tree_node.cut_size = cut_size
+        tree_node.validity_threshold = valid_threshold
+        tree_node.mincut_algorithm = "kecc"
+        if cut_size <= valid_threshold:
             tree_node.cm_valid = False
-
+            tree_node.extant = False
+            split_cluster(tree_node, [piece for piece, _ in pieces], node_mapping, stack)
             if not quiet_g:
-                log = log.bind(
-                    g_id=subgraph.index,
-                    g_n=subgraph.n(),
-                    g_m=subgraph.m(),
-                    g_mcd=subgraph.mcd(),
-                )
-                log.info("pruned graph", num_pruned=num_pruned)
-
-            # (VR) Create a TreeNodeCluster for the pruned cluster and set it as the current node's child
-            new_child = ClusterTreeNode()
-            subgraph.index = f"{subgraph.index}δ"
-            annotate_tree_node(new_child, subgraph)
-            tree_node.add_child(new_child)
-            node_mapping[subgraph.index] = new_child
+                log.info("cluster split into k-edge-connected components", num_parts=len(pieces))
+        elif not quiet_g:
+            log.info("cut valid, not splitting anymore")
+        return
+
+    # (VR) Compute the validity threshold, the mincut is then computed by the caller
+    valid_threshold = requirement.validity_threshold(clusterer, subgraph)
+    if not quiet_g:
+        log.debug("calculated validity threshold", validity_threshold=valid_threshold)
+    return tree_node, subgraph, valid_threshold
+
+
+def finish_cluster(
+    tree_node: ClusterTreeNode,
+    subgraph: RealizedSubgraph,
+    valid_threshold: float,
+    mincut_res,
+    node_mapping: Dict[str, ClusterTreeNode],
+    stack: List[RealizedSubgraph],
+):
+    """ (VR) Split a cluster along its mincut if it is not well-connected, pushing the new clusters onto the stack
 
-            # (VR) Iterate to the new node
-            tree_node = new_child
-            update_cid_membership(subgraph, node2cids)
+    The mincut is only decided against the threshold when computed on a certificate
+    """
+    if not quiet_g:
+        log = get_logger().bind(
+            g_id=subgraph.index,
+            g_n=subgraph.n(),
+            g_m=subgraph.m(),
+            g_mcd=subgraph.mcd(),
+        )
+        log.debug(
+            "mincut computed",
+            cut_size=mincut_res[-1],
+        )
 
-        # (VR) Compute the mincut and validity threshold of the cluster
-        mincut_res = subgraph.find_mincut()
-        valid_threshold = requirement.validity_threshold(clusterer, subgraph)
+    # (VR) Set the current cluster's cut size
+    tree_node.cut_size = mincut_res[-1]
+    tree_node.validity_threshold = valid_threshold
+    tree_node.mincut_algorithm = getattr(mincut_res, "algorithm", None)
+
+    # (VR) If the cut size is below validity, split!
+    if mincut_res[-1] <= valid_threshold:    # and mincut_res.get_cut_size >= 0: -> (VR) Change: Commented this out to handle disconnected clusters
+        tree_node.cm_valid = False                      # (VR) Change: The current cluster has been changed, so its not extant or CM valid anymore
+        tree_node.extant = False
+        
+        # (VR) Split partitions and set them as children nodes, optionally along the other mincuts at the same time
+        # when that matches cutting them one at a time (see `cut_in_every_part`)
+        partitions = []
+        if all_mincuts_g:
+            num_parts, labels = minimum_cut_atoms(subgraph, mincut_res)
+            partitions = subgraph.split_by_labels(labels, num_parts)
+            if not cut_in_every_part(partitions, mincut_res[-1]):
+                partitions = []
+        if not partitions:
+            num_parts = 2
+            partitions = subgraph.cut_by_mincut(mincut_res)
+        split_cluster(tree_node, partitions, node_mapping, stack)
+
+        # (VR) Log the partitions
         if not quiet_g:
-            log.debug("calculated validity threshold", validity_threshold=valid_threshold)
-            log.debug(
-                "mincut computed",
-                cut_size=mincut_res[-1],
-            )
+            log.info("cluster split", num_parts=num_parts)
+    else:
+        if not quiet_g:
+            log.info("cut valid, not splitting anymore")
 
-        # (VR) Set the current cluster's cut size
-        tree_node.cut_size = mincut_res[-1]
-        tree_node.validity_threshold = valid_threshold
 
-        # (VR) If the cut size is below validity, split!
-        if mincut_res[-1] <= valid_threshold:    # and mincut_res.get_cut_size >= 0: -> (VR) Change: Commented this out to handle disconnected clusters
-            tree_node.cm_valid = False                      # (VR) Change: The current cluster has been changed, so its not extant or CM valid anymore
-            tree_node.extant = False
-            
-            # (VR) Split partitions and set them as children nodes
-            partitions = subgraph.cut_by_mincut(mincut_res)
+def cut_in_every_part(partitions: List[RealizedSubgraph], cut_size: int) -> bool:
+    """ (VR) Would each part of a cluster split along several cuts at once still be cut by a cut of this size?
 
-            for p in partitions:
-                if p.n() > 1:
-                    node = ClusterTreeNode()
-                    annotate_tree_node(node, p)
-                    node.cm_valid = False
-                    tree_node.add_child(node)
-                    node_mapping[p.index] = node
+    Only then does the split match cutting the cluster one mincut at a time: the threshold does not
+    decrease with the size and the minimum degree, and any union of parts the recursion goes through
+    is larger than each of its parts, with a minimum degree at least the smallest of theirs, so it
+    is cut too. With a threshold depending on the size, a small part would otherwise be split off a
+    cluster that the recursion leaves whole once the first cut is made.
+    """
+    return all(cut_size <= requirement.validity_threshold(clusterer, p) for p in partitions)
 
-                    subp = list(clusterer.cluster_without_singletons(p))
-                    subp = [s.realize(p) for s in subp]
 
-                    for sg in subp:
-                        n = ClusterTreeNode()
-                        annotate_tree_node(n, sg)
-                        node_mapping[sg.index] = n
-                        node.add_child(n)
+def split_cluster(
+    tree_node: ClusterTreeNode,
+    partitions: List[RealizedSubgraph],
+    node_mapping: Dict[str, ClusterTreeNode],
+    stack: List[RealizedSubgraph],
+):
+    """ (VR) Recluster the non-singleton partitions of a split cluster and push the new clusters onto the stack """
+    for p in partitions:
+        if p.n() > 1:
+            node = ClusterTreeNode()
+            annotate_tree_node(node, p)
+            node.cm_valid = False
+            tree_node.add_child(node)
+            node_mapping[p.index] = node
 
-                    stack.extend(subp)
+            # (VR) The children are realized from the partition, so that the next round reuses its induced edges
+            # instead of gathering the rows of the global graph again
+            subp = [s.realize(p) for s in recluster(p)]
 
-            # (VR) Log the partitions
-            if not quiet_g:
-                log.info("cluster split")
-        else:
-            if not quiet_g:
-                log.info("cut valid, not splitting anymore")
+            for sg in subp:
+                n = ClusterTreeNode()
+                annotate_tree_node(n, sg)
+                node_mapping[sg.index] = n
+                node.add_child(n)
 
-    return (node_mapping, node2cids)
+            stack.extend(subp)
 
 
 def algorithm_g(
     graphs: List[IntangibleSubgraph],
     quiet: bool,
-    cores: int
-) -> Tuple[List[IntangibleSubgraph], Dict[int, str], ts.Tree]:
+    cores: int,
+    timings: Optional[Dict[str, float]] = None,
+    start_method: Optional[str] = None,
+    preprune: bool = False,
+    split_bridges: bool = False,
+    mode: CMMode = CMMode.recursive,
+    certificate: bool = False,
+    all_mincuts: bool = False,
+    cache: Optional[ResultCache] = None,
+    checkpoint: Optional[Checkpointer] = None,
+    resume: bool = False,
+) -> Tuple[Dict[int, str], ts.Tree, Dict[str, float]]:
     """ (VR) Main algorithm in hm01 
     
     Params:
-        global_graph (Graph)                                : full graph from input
+        global_graph (CSRGraph)                             : full graph from input, exported to shared memory
         graph (List[IntangibleSubgraph])                    : list of clusters
         clusterer (Union[IkcClusterer, LeidenClusterer])    : clustering algorithm
         requirement (MincutRequirement)                     : mincut connectivity requirement
+        timings (Dict[str, float])                          : seconds spent on each input cluster in a previous run
+        start_method (str)                                  : multiprocessing start method, the platform default if None
+        preprune (bool)                                     : prune all the clusters in one vectorized pass before dispatching them
+        split_bridges (bool)                                : split clusters along all of their bridges at once
+        mode (CMMode)                                       : recursive mincuts, or k-edge-connected components for constant thresholds
+        certificate (bool)                                  : decide the validity of the clusters on sparse certificates
+        all_mincuts (bool)                                  : split clusters along all the mincuts found around the first one
+        cache (ResultCache)                                 : persistent store of mincut and recluster results, if any
+        checkpoint (Checkpointer)                           : periodic checkpoints of the merged results, if any
+        resume (bool)                                       : replay the checkpoints of a previous run and only process what is left
+
+    Returns: node to cluster id labels, the recursion tree, and the seconds spent on each input cluster
     """
     # Share quiet variable with processes
     global quiet_g
@@ -276,41 +549,129 @@ def algorithm_g(
     node_mapping: Dict[str, ClusterTreeNode] = {}       # (VR) node_mapping: maps cluster id to cluster tree node  
     node2cids: Dict[int, str] = {}                      # (VR) node2cids: Mapping between nodes and cluster ID  
 
-    # (VR) Split data into parititions such that each core handles one partition
-    mapping_split = [{} for _ in range(cores)]
-    stacks = [[] for _ in range(cores)]
-    labeling_split = [{} for _ in range(cores)]
-
-    # (VR) Fill each partition
-    for i, g in enumerate(graphs):
+    # (VR) Create the tree nodes of the input clusters
+    for g in graphs:
         n = ClusterTreeNode()
         annotate_tree_node(n, g)
         n.extant = True                                 # (VR) Input clusters are marked extant by default until they are changed
         node_mapping[g.index] = n
-        mapping_split[i % cores][g.index] = n
-        stacks[i % cores].append(g)
-
-    # (VR) Map the algorithm to each partition
-    with mp.Pool(cores) as p:
-        out = p.starmap(par_task,
-            list(
-                zip(
-                    stacks, 
-                    mapping_split, 
-                    labeling_split)))
-
-    # (VR) Merge partitions into single return data
-    for mapping, label_part in out:
-        if mapping is not None:
-            node_mapping.update(mapping)
+
+    # (VR) Optionally prune the clusters ahead of dispatch, the workers then receive the pruned (δ) clusters
+    dispatched = graphs
+    if preprune:
+        pruned = prune_clusters(global_graph, graphs, requirement, clusterer)
+        dispatched = list(graphs)
+        for i, (kept, original_mcd) in pruned.items():
+            g = graphs[i]
+            update_cid_membership(g, node2cids)
+            tree_node = node_mapping[g.index]
+            tree_node.cut_size = original_mcd
+            tree_node.extant = False
+            tree_node.cm_valid = False
+
+            delta = IntangibleSubgraph(kept.tolist(), f"{g.index}δ")
+            new_child = ClusterTreeNode()
+            annotate_tree_node(new_child, delta)
+            tree_node.add_child(new_child)
+            node_mapping[delta.index] = new_child
+            dispatched[i] = delta
+        if not quiet:
+            log.info("pre-pruned clusters", num_pruned=len(pruned))
+
+    elapsed: Dict[str, float] = {}
+
+    def merge(out) -> List[IntangibleSubgraph]:
+        """ (VR) Merge the result of a batch into the master state, returns the children to process """
+        mapping, label_part, children, batch_elapsed = out
+        graft_tree_nodes(node_mapping, mapping)
         node2cids.update(label_part)
+        elapsed.update(batch_elapsed)
+        return children
+
+    # (VR) On resume, the results of the previous run are merged again and only the clusters
+    # that have none (the input clusters left and the children not processed yet) are dispatched
+    if checkpoint is not None:
+        restored = checkpoint.start(resume)
+        if restored:
+            children = [child for out in restored for child in merge(out)]
+            dispatched = [g for g in list(dispatched) + children if g.index not in elapsed]
+            if not quiet:
+                log.info("resumed from checkpoint", num_results=len(restored), num_left=len(dispatched))
+
+    # (VR) Estimate the cost of each cluster and dispatch them longest-expected-work-first,
+    # so that the giant clusters start immediately and the small ones fill in the gaps
+    cost_model = CostModel(global_graph.degrees(), timings)
+    costs = cost_model.costs(dispatched)
+    if not quiet:
+        log.info(
+            "predicted makespan",
+            makespan=predict_makespan(costs, cores),
+            unit=cost_model.unit,
+            cores=cores)
+    ordered, ordered_costs = longest_first(dispatched, costs)
+    batches = batch_by_cost(ordered, ordered_costs, sum(costs) / (cores * 4))
+
+    # (VR) Workers pull tasks from the pool's shared queue, and the children produced by
+    # a split are queued again so that any idle worker can take them
+    results: queue.Queue = queue.Queue()
+    ctx = mp.get_context(start_method)
+    forked = ctx.get_start_method() == "fork"
+    initargs = (
+        global_graph.handle,
+        clusterer if forked or clusterer_source is None else None,
+        clusterer_source,
+        requirement,
+        quiet,
+        split_bridges,
+        mode,
+        certificate,
+        mincut.config,
+        all_mincuts,
+        cache,
+    )
+    with ctx.Pool(cores, initializer=init_worker, initargs=initargs) as p:
+        def submit(batch):
+            p.apply_async(
+                par_task,
+                (batch,),
+                callback=results.put,
+                error_callback=results.put)
+
+        pending = 0
+        for batch in batches:
+            submit(batch)
+            pending += 1
+
+        # (VR) Merge results as they arrive and dispatch the children
+        while pending:
+            out = results.get()
+            pending -= 1
+            if isinstance(out, BaseException):
+                raise out
+
+            children = merge(out)
+            if checkpoint is not None:
+                checkpoint.record(out)
+
+            for child in children:
+                submit([child])
+                pending += 1
+
+    if checkpoint is not None:
+        checkpoint.close()
 
     # (VR) Add each initial clustering node as children of the tree root
     for g in graphs:
         n = node_mapping[g.index]
         tree.root.add_child(n)
 
-    return node2cids, tree
+    # (VR) Attribute the time spent on every descendant to its input cluster
+    input_timings = {
+        g.index: sum(elapsed.get(d.label, 0.0) for d in node_mapping[g.index].traverse_preorder())
+        for g in graphs
+    }
+
+    return node2cids, tree, input_timings
 
 
 def load_clusterer(module_file, clusterer_args_file):
@@ -374,17 +735,32 @@ def main(
         "-k",
         help="(IKC Only) k parameter.",
     ),
+    ikc_modularity: bool = typer.Option(
+        False,
+        "--ikc_modularity",
+        help="(IKC Only) Reject the IKC clusters whose modularity is not positive.",
+    ),
     resolution: float = typer.Option(
         -1,
         "--resolution",
         "-g",
         help="(Leiden Only) Resolution parameter.",
     ),
+    n_iterations: int = typer.Option(
+        2,
+        "--n_iterations",
+        help="(Leiden Only) Number of iterations, or a negative number to iterate until the partition is stable. Reclustering always stops once the partition is stable.",
+    ),
+    seed: int = typer.Option(
+        -1,
+        "--seed",
+        help="(Leiden Only) Random seed, used for every (re)clustering. -1 for no seed.",
+    ),
     threshold: str = typer.Option(
         "",
         "--threshold",
         "-t",
-        help="Connectivity threshold which all clusters should be above.",
+        help="Connectivity threshold which all clusters should be above, or a comma separated list of them to sweep in one run.",
     ),
     output: str = typer.Option(
         "",
@@ -398,6 +774,76 @@ def main(
         "-n",
         help="Number of cores to run in parallel.",
     ),
+    timings_file: str = typer.Option(
+        "",
+        "--timings",
+        help="Per-cluster timings ('cluster_id seconds') written by a previous run, used to order and predict the work.",
+    ),
+    start_method: str = typer.Option(
+        "",
+        "--start_method",
+        help="Multiprocessing start method (fork, forkserver or spawn). Defaults to the platform default.",
+    ),
+    preprune: bool = typer.Option(
+        False,
+        "--preprune",
+        help="Prune all the input clusters in one vectorized pass before dispatching them to the workers.",
+    ),
+    split_bridges: bool = typer.Option(
+        False,
+        "--split_bridges",
+        help="Split clusters along all of their bridges at once, when every part still has a threshold of at least 1.",
+    ),
+    mode: CMMode = typer.Option(
+        CMMode.recursive,
+        "--mode",
+        help="Split clusters one mincut at a time (recursive), or into their maximal k-edge-connected subgraphs (kecc, constant thresholds only).",
+    ),
+    certificate: bool = typer.Option(
+        False,
+        "--certificate",
+        help="Decide whether the mincut is above the threshold on a sparse certificate of the cluster. The cut size recorded for valid clusters is then a lower bound.",
+    ),
+    mincut_algorithm: str = typer.Option(
+        "cactus",
+        "--mincut_algorithm",
+        help=f"VieCut algorithm ({', '.join(ALGORITHMS)}), or auto to pick one by cluster size.",
+    ),
+    mincut_queue: str = typer.Option(
+        "bqueue",
+        "--mincut_queue",
+        help=f"VieCut priority queue implementation ({', '.join(QUEUES)}).",
+    ),
+    small_cutoff: int = typer.Option(
+        64,
+        "--small_cutoff",
+        help="With the auto mincut algorithm, clusters with at most this many nodes are cut in process, many at a time.",
+    ),
+    all_mincuts: bool = typer.Option(
+        False,
+        "--all_mincuts",
+        help="Split a cluster that is not well-connected along all of its minimum cuts at once, instead of only one of them, when every part would still be cut.",
+    ),
+    cache_dir: str = typer.Option(
+        "",
+        "--cache_dir",
+        help="Directory of a persistent cache of mincut and recluster results, shared by runs on the same network.",
+    ),
+    cache_size: int = typer.Option(
+        10240,
+        "--cache_size",
+        help="Size bound of the cache in MB, the least recently used results are evicted above it.",
+    ),
+    checkpoint_interval: float = typer.Option(
+        0,
+        "--checkpoint_interval",
+        help="Write the results merged so far to a checkpoint in the working directory every this many seconds (0 to disable).",
+    ),
+    resume: bool = typer.Option(
+        False,
+        "--resume",
+        help="Resume from the checkpoints of a previous run with the same parameters, only processing the clusters it had not finished.",
+    ),
     # first_tsv: bool = typer.Option(
     #     False,
     #     "--firsttsv",
@@ -413,29 +859,34 @@ def main(
     if len(output) == 0:
         output = '.tsv'
 
-    # (VR) Initialize shared global variables (TODO: Windows does not share
-    # globalised variables between processes, adjust this to allow SM on Windows)
+    # (VR) Initialize shared global variables, the pool workers receive them through init_worker
     global clusterer
+    global clusterer_source
     global requirement
     global global_graph
 
     # (VR) Setting a really high recursion limit to prevent stack overflow errors
     sys.setrecursionlimit(1231231234)
 
+    assert start_method in ("", *mp.get_all_start_methods()), f"Unknown start method {start_method}"
+
     # (VR) Check -g and -k parameters for Leiden and IKC respectively
+    clusterer_source = None
     if clusterer_spec == ClustererSpec.leiden:
         assert resolution != -1, "Leiden requires resolution"
-        clusterer = LeidenClusterer(resolution)
+        clusterer = LeidenClusterer(resolution, n_iterations=n_iterations, seed=seed if seed != -1 else None)
     elif clusterer_spec == ClustererSpec.leiden_mod:
         assert resolution == -1, "Leiden with modularity does not support resolution"
-        clusterer = LeidenClusterer(resolution, quality=Quality.modularity)
+        clusterer = LeidenClusterer(resolution, quality=Quality.modularity, n_iterations=n_iterations,
+                                    seed=seed if seed != -1 else None)
     elif clusterer_spec == ClustererSpec.ikc:
         assert k != -1, "IKC requires k"
-        clusterer = IkcClusterer(k)
+        clusterer = IkcClusterer(k, ikc_modularity)
     else:
         assert clusterer_file != "", "File is required for external clusterers"
         # It is an external clusterer, load it.
         clusterer = load_clusterer(clusterer_file, clusterer_args)
+        clusterer_source = (clusterer_file, clusterer_args)
 
     # (VR) Change get working dir iff IKC
     context.with_working_dir(input_.split('/')[-1] + "_working_dir")
@@ -449,31 +900,46 @@ def main(
             clusterer=clusterer,
         )
 
-    # (VR) Parse mincut threshold specification
-    requirement = MincutRequirement.try_from_str(threshold)
+    # (VR) Parse mincut threshold specification, a sweep runs CM once per threshold
+    thresholds = [t.replace(" ", "") for t in threshold.split(",")]
+    requirements = [MincutRequirement.try_from_str(t) for t in thresholds]
     if not quiet:
-        log.info("parsed connectivity requirement", requirement=requirement)
+        log.info("parsed connectivity requirement", requirement=requirements)
+
+    for requirement in requirements:
+        assert mode != CMMode.kecc or (requirement.log10 == 0 and requirement.mcd == 0), \
+            "k-ECC mode requires a constant threshold"
+    assert mincut_algorithm in (*ALGORITHMS, "auto"), f"Unknown mincut algorithm {mincut_algorithm}"
+    assert mincut_queue in QUEUES, f"Unknown queue implementation {mincut_queue}"
+    mincut.config = MincutConfig(mincut_algorithm, mincut_queue, small_n=small_cutoff)
+    assert not resume or checkpoint_interval > 0, "--resume requires --checkpoint_interval"
 
     # (VR) Get the initial time for reporting the time it took to load the graph
     time1 = time.time()
 
-    # (VR) Load full graph into Graph object
-    edgelist_reader = nk.graphio.EdgeListReader("\t", 0)
-    nk_graph = edgelist_reader.read(input_)
+    # (VR) Load full graph as CSR arrays and export it to shared memory for the workers
+    global_graph = CSRGraph.from_edgelist(input_).to_shared_memory()
+    atexit.register(global_graph.close, True)
     if not quiet:
         log.info(
             "loaded graph",
-            n=nk_graph.numberOfNodes(),
-            m=nk_graph.numberOfEdges(),
+            n=global_graph.n(),
+            m=global_graph.m(),
             elapsed=time.time() - time1,
         )
-    global_graph = Graph(nk_graph, "")
+
+    # (VR) The runs of a sweep share their mincuts and reclusterings through the cache, a temporary one by default
+    if not cache_dir and len(requirements) > 1:
+        cache_dir = tempfile.mkdtemp(prefix="hm01_cache_")
+        atexit.register(shutil.rmtree, cache_dir, True)
+    cache = ResultCache(cache_dir, cache_size * 2**20, global_graph.fingerprint()) if cache_dir else None
 
     # (VR) Load clustering
     if not existing_clustering:
         if not quiet:
             log.info(f"running clusterer before algorithm-g", clusterer=clusterer)
-        clusters = list(clusterer.cluster_without_singletons(global_graph))
+        edgelist_reader = nk.graphio.EdgeListReader("\t", 0)
+        clusters = list(clusterer.cluster_without_singletons(Graph(edgelist_reader.read(input_), "")))
     else:
         if not quiet:
             log.info(f"loading existing clustering before algorithm-g", clusterer=clusterer)
@@ -486,29 +952,47 @@ def main(
             summary=summarize_graphs(clusters),
         )
 
-    # (VR) Call the main CM algorithm
+    # (VR) Call the main CM algorithm, once per threshold of a sweep
+    root, ext = os.path.splitext(output)
+    timings = CostModel.read_timings(timings_file) if timings_file else None
+    for t, requirement in zip(thresholds, requirements):
+        # (VR) Start the timer for the algorithmic stage of CM
+        if not quiet:
+            log.info("running threshold", threshold=t)
+            time1 = time.perf_counter()
+
+        checkpoint = None
+        if checkpoint_interval > 0:
+            # (VR) Everything that changes the results, so that a run is never resumed from another one's
+            meta = dict(
+                threshold=t, network=global_graph.fingerprint(), clusterer=repr(clusterer), num_clusters=len(clusters),
+                mode=mode.value, preprune=preprune, split_bridges=split_bridges, certificate=certificate,
+                all_mincuts=all_mincuts, mincut=repr(mincut.config),
+            )
+            checkpoint = Checkpointer(f"checkpoints_{t}", checkpoint_interval, meta)
 
-    # (VR) Start the timer for the algorithmic stage of CM
-    if not quiet:
-        time1 = time.perf_counter()
+        labels, tree, cluster_timings = algorithm_g(
+            clusters, quiet, cores, timings, start_method or None, preprune, split_bridges, mode, certificate,
+            all_mincuts, cache, checkpoint, resume,
+        )
+        if cache is not None:
+            cache.evict()
 
-    labels, tree = algorithm_g(
-        clusters, quiet, cores
-    )
+        # (VR) Log the output time for the algorithmic stage of CM
+        if not quiet:
+            log.info(
+                "CM algorithm completed", 
+                time_elapsed=time.perf_counter() - time1)
 
-    # (VR) Log the output time for the algorithmic stage of CM
-    if not quiet:
-        log.info(
-            "CM algorithm completed", 
-            time_elapsed=time.perf_counter() - time1)
-    
-    # (VR) Output the json data
-    with open(output + ".tree.json", "w+") as f:
-        f.write(cast(str, jsonpickle.encode(tree)))
-    cm2universal(quiet, tree, labels, output)
+        # (VR) Output the json data, each threshold of a sweep gets its own output files
+        run_output = output if len(requirements) == 1 else f"{root}.{t}{ext}"
+        with open(run_output + ".tree.json", "w+") as f:
+            f.write(cast(str, jsonpickle.encode(tree)))
+        CostModel.write_timings(run_output + ".timings", cluster_timings)
+        cm2universal(quiet, tree, labels, run_output)
 
-    # (VR) Convert the 'after' json into a tsv file with columns (node_id, cluster_id)
-    json2membership(output + ".after.json", output)
+        # (VR) Convert the 'after' json into a tsv file with columns (node_id, cluster_id)
+        json2membership(run_output + ".after.json", run_output)
 
 
 def entry_point():
@@ -516,5 +1000,4 @@ def entry_point():
 
 
 if __name__ == "__main__":
-    mp.set_start_method('fork')
     entry_point()
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components as csgraph_components
+
+import hm01.mincut as mincut
+from hm01.graph import RealizedSubgraph, compact_edges_to_csr, gather_rows, induced_csr
+
+
+def connected_components(graph: RealizedSubgraph) -> Tuple[int, np.ndarray]:
+    """ (VR) Find the connected components of a subgraph in linear time
+
+    Returns: the number of components and the component of every (compacted) local node. The
+    components are numbered by increasing size, so that the light side comes first like in VieCut.
+    """
+    indptr, indices = graph.local_csr()
+    n = graph.n()
+    adjacency = csr_matrix((np.ones(len(indices), dtype=np.int8), indices, indptr), shape=(n, n))
+    num_components, labels = csgraph_components(adjacency, directed=False)
+    return num_components, light_first(num_components, labels)
+
+
+def two_edge_connected_components(graph: RealizedSubgraph) -> Tuple[int, np.ndarray]:
+    """ (VR) Find the 2-edge-connected components of a subgraph, i.e. split it along all of its bridges
+
+    Iterative Tarjan low-link over the local CSR, O(n + m). A vertex closes a component when no
+    edge of its DFS subtree reaches above it, in which case the edge to its parent is a bridge.
+
+    Returns: the number of components and the component of every (compacted) local node, numbered
+    by increasing size
+    """
+    indptr_arr, indices_arr = graph.local_csr()
+    indptr = indptr_arr.tolist()
+    indices = indices_arr.tolist()
+    n = graph.n()
+
+    disc = [-1] * n
+    low = [0] * n
+    labels = [-1] * n
+    stack: List[int] = []
+    timer = 0
+    count = 0
+    for root in range(n):
+        if disc[root] != -1:
+            continue
+        disc[root] = low[root] = timer
+        timer += 1
+        stack.append(root)
+        work = [(root, -1, indptr[root])]       # (VR) DFS frames of (vertex, parent, next edge to visit)
+        while work:
+            v, parent, i = work[-1]
+            if i < indptr[v + 1]:
+                work[-1] = (v, parent, i + 1)
+                w = indices[i]
+                if w == parent:
+                    continue
+                if disc[w] == -1:
+                    disc[w] = low[w] = timer
+                    timer += 1
+                    stack.append(w)
+                    work.append((w, v, indptr[w]))
+                elif disc[w] < low[v]:
+                    low[v] = disc[w]
+                continue
+
+            work.pop()
+            if parent != -1 and low[v] < low[parent]:
+                low[parent] = low[v]
+            if low[v] == disc[v]:
+                while True:
+                    x = stack.pop()
+                    labels[x] = count
+                    if x == v:
+                        break
+                count += 1
+
+    return count, light_first(count, np.asarray(labels, dtype=np.int64))
+
+
+def minimum_cut_atoms(graph: RealizedSubgraph, cut_result) -> Tuple[int, np.ndarray]:
+    """ (VR) Split a subgraph along the minimum cuts found around a first one, instead of only that one
+
+    With a mincut of size 1 these are the 2-edge-connected components. Otherwise both sides of the
+    cut are refined: a part is split by a mincut of the graph that has one side inside the part
+    (see `_split_off_minimum_cut`), until no such cut is found. Crossing mincuts can always be
+    uncrossed into one inside the part, but a part is only tried with one of its vertices left out,
+    so a part can still hold a mincut that the next round of CM finds.
+
+    Returns: the number of parts and the part of every (compacted) local node, numbered by
+    increasing size
+    """
+    cut_size = cut_result[-1]
+    if cut_size == 0:
+        return connected_components(graph)
+    if cut_size == 1:
+        return two_edge_connected_components(graph)
+
+    indptr, indices = graph.local_csr()
+    n = graph.n()
+    degrees = np.diff(indptr)
+    member = np.zeros(n, dtype=bool)
+    light = np.searchsorted(graph.hydrator, np.sort(np.asarray(cut_result[0], dtype=np.int64)))
+    parts = []
+    work = [light, np.setdiff1d(np.arange(n), light)]
+    while work:
+        part = work.pop()
+        side = _split_off_minimum_cut(indptr, indices, degrees, part, cut_size, member, graph.index)
+        if side is None:
+            parts.append(part)
+        else:
+            work.extend([part[side], part[~side]])
+
+    labels = np.empty(n, dtype=np.int64)
+    for i, part in enumerate(parts):
+        labels[part] = i
+    return len(parts), light_first(len(parts), labels)
+
+
+def _split_off_minimum_cut(indptr: np.ndarray, indices: np.ndarray, degrees: np.ndarray, part: np.ndarray,
+                           cut_size: int, member: np.ndarray, index: str) -> Optional[np.ndarray]:
+    """ (VR) Mask over the sorted local ids `part` of the side of a cut of size `cut_size` that lies inside it
+
+    The rest of the graph is contracted into a clique of cut_size + 2 nodes, which no cut of size
+    cut_size can split, and each edge leaving the part goes to a different node of the clique.
+    Vertices with more than cut_size edges leaving the part can not be inside the side, so they are
+    contracted too (making room in the clique), and so is one more vertex if there is none, so
+    that the part itself is not returned. Returns None if the mincut of the contracted graph is larger.
+    """
+    if len(part) < 2:
+        return None
+    sub_indptr, sub_indices = induced_csr(indptr, indices, part, member)
+    outer = degrees[part] - np.diff(sub_indptr)
+    inside = np.ones(len(part), dtype=bool)
+
+    def contract(frontier: np.ndarray):
+        while len(frontier):
+            inside[frontier] = False
+            _, neighbors = gather_rows(sub_indptr, sub_indices, frontier)
+            neighbors = neighbors[inside[neighbors]]
+            np.add.at(outer, neighbors, 1)
+            frontier = np.unique(neighbors)
+            frontier = frontier[outer[frontier] > cut_size]
+
+    contract(np.flatnonzero(outer > cut_size))
+    if inside.all():
+        contract(np.array([np.argmax(outer)]))
+    kept = np.flatnonzero(inside)
+    if len(kept) == 0:
+        return None
+
+    # (VR) The kept vertices are 0..q-1 in the contracted graph, the clique q..q+cut_size+1
+    q = len(kept)
+    relabel = np.cumsum(inside) - 1
+    rows = np.repeat(np.arange(len(part)), np.diff(sub_indptr))
+    edges = (rows < sub_indices) & inside[rows] & inside[sub_indices]
+    leaving = outer[kept]
+    clique_src, clique_dst = np.triu_indices(cut_size + 2, 1)
+    src = np.concatenate([relabel[rows[edges]], np.repeat(np.arange(q), leaving), clique_src + q])
+    dst = np.concatenate([
+        relabel[sub_indices[edges]],
+        q + np.arange(int(leaving.sum())) - np.repeat(np.cumsum(leaving) - leaving, leaving),
+        clique_dst + q,
+    ])
+    size = q + cut_size + 2
+    contracted = RealizedSubgraph.from_csr(np.arange(size), *compact_edges_to_csr(src, dst, size), index)
+
+    light, heavy, found = mincut.viecut(contracted)
+    if found > cut_size:
+        return None
+    side = np.asarray(light if q + cut_size + 1 in heavy else heavy, dtype=np.int64)
+    mask = np.zeros(len(part), dtype=bool)
+    mask[kept[side]] = True
+    return mask
+
+
+def light_first(count: int, labels: np.ndarray) -> np.ndarray:
+    """ (VR) Renumber the labels 0..count-1 by increasing part size (ties keep their order) """
+    if count <= 1:
+        return labels
+    order = np.argsort(np.bincount(labels, minlength=count), kind="stable")
+    rank = np.empty(count, dtype=np.int64)
+    rank[order] = np.arange(count)
+    return rank[labels]
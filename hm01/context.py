@@ -2,7 +2,7 @@ import atexit
 from functools import cached_property
 import glob
 import shutil
-from typing import Optional
+from typing import List, Optional
 import os
 import hashlib
 
@@ -50,6 +50,10 @@ class Context:
             return None
         return max(checkpoints, key=os.path.getctime)
     
+    def find_checkpoints(self, subdir) -> List[str]:
+        # (VR) (For Checkpointing) Get the checkpoints of a run in the order they were written
+        return sorted(glob.glob(os.path.join(self.working_dir, subdir, "*.pkl")))
+
     def with_working_dir(self, working_dir):
         self._working_dir = working_dir
         return self
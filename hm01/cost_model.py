@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import heapq
+import math
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from hm01.graph import IntangibleSubgraph, RealizedSubgraph
+
+
+def estimate_cost(n: int, m: float, max_degree: float = 0) -> float:
+    """ (VR) Expected amount of work CM spends on a cluster, in abstract units
+
+    A mincut round is near-linear in the size of the cluster, and the number of rounds grows
+    with the depth of the recursion, which is roughly logarithmic in n. Hubs make both the
+    cut and the reclustering of the sides more expensive, so the max degree is added on top.
+    """
+    if n <= 1:
+        return 0.0
+    return (n + m + max_degree) * math.log2(n + 1)
+
+
+class CostModel:
+    """ (VR) Per-cluster cost estimates used to schedule the CM work
+
+    Costs come from `estimate_cost` on the cluster's n, m and degree statistics. If the
+    timings of a previous run are given, clusters that were timed use their recorded time,
+    and the estimates of the rest are scaled to seconds with a factor fitted on the timed ones.
+    """
+
+    def __init__(self, degrees: np.ndarray, timings: Optional[Dict[str, float]] = None):
+        self.degrees = degrees
+        self.timings = timings or {}
+        self.scale: Optional[float] = None
+
+    def raw_cost(self, graph: Union[IntangibleSubgraph, RealizedSubgraph]) -> float:
+        """ (VR) Estimate from the global degrees of the cluster's nodes
+
+        The number of edges inside the cluster is bounded by half of its volume and by the
+        number of pairs of nodes, so we take the smaller of the two.
+        """
+        n = graph.n()
+        if n <= 1:
+            return 0.0
+        degrees = self.degrees[np.fromiter(graph.nodes(), dtype=np.int64, count=n)]
+        m = min(int(degrees.sum()) / 2, n * (n - 1) / 2)
+        return estimate_cost(n, m, min(int(degrees.max()), n - 1))
+
+    def costs(self, graphs: Sequence[Union[IntangibleSubgraph, RealizedSubgraph]]) -> List[float]:
+        """ (VR) Cost of every cluster, in seconds if timings are known and in units otherwise """
+        raw = [self.raw_cost(g) for g in graphs]
+        if not self.timings:
+            return raw
+
+        timed = [(self.timings[g.index], c) for g, c in zip(graphs, raw) if g.index in self.timings]
+        total_raw = sum(c for _, c in timed)
+        self.scale = sum(t for t, _ in timed) / total_raw if total_raw > 0 else 0.0
+        return [
+            self.timings.get(g.index, c * self.scale)
+            for g, c in zip(graphs, raw)
+        ]
+
+    @property
+    def unit(self) -> str:
+        return "seconds" if self.timings else "cost units"
+
+    @staticmethod
+    def read_timings(filepath: str) -> Dict[str, float]:
+        """ (VR) Read the 'cluster_id seconds' lines written by a previous run """
+        timings: Dict[str, float] = {}
+        with open(filepath) as f:
+            for line in f:
+                cluster_id, seconds = line.split()
+                timings[cluster_id] = float(seconds)
+        return timings
+
+    @staticmethod
+    def write_timings(filepath: str, timings: Dict[str, float]):
+        with open(filepath, "w+") as f:
+            for cluster_id, seconds in timings.items():
+                f.write(f"{cluster_id}\t{seconds}\n")
+
+
+def longest_first(
+    graphs: Sequence[IntangibleSubgraph], costs: Sequence[float]
+) -> Tuple[List[IntangibleSubgraph], List[float]]:
+    """ (VR) Sort the clusters by decreasing cost (longest-processing-time-first) """
+    order = sorted(range(len(graphs)), key=lambda i: costs[i], reverse=True)
+    return [graphs[i] for i in order], [costs[i] for i in order]
+
+
+def batch_by_cost(
+    graphs: Sequence[IntangibleSubgraph], costs: Sequence[float], target: float
+) -> List[List[IntangibleSubgraph]]:
+    """ (VR) Group consecutive clusters into batches of about `target` cost
+
+    Expensive clusters end up alone in their batch, while small ones are grouped so that
+    the per-task overhead does not dominate.
+    """
+    batches: List[List[IntangibleSubgraph]] = []
+    batch: List[IntangibleSubgraph] = []
+    batch_cost = 0.0
+    for g, c in zip(graphs, costs):
+        batch.append(g)
+        batch_cost += c
+        if batch_cost >= target:
+            batches.append(batch)
+            batch = []
+            batch_cost = 0.0
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def predict_makespan(costs: Sequence[float], cores: int) -> float:
+    """ (VR) Makespan of a longest-processing-time-first schedule of `costs` on `cores` workers """
+    loads = [0.0] * max(cores, 1)
+    for c in sorted(costs, reverse=True):
+        heapq.heapreplace(loads, loads[0] + c)
+    return max(loads)
@@ -5,9 +5,13 @@ from __future__ import annotations
 from abc import abstractmethod
 from dataclasses import dataclass
 from functools import cache, cached_property
-from typing import Dict, Iterator, List, Tuple, Union
+import hashlib
+from itertools import chain
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
 import networkit as nk
+import numpy as np
 
 import hm01.mincut as mincut
 from hm01.context import context
@@ -16,6 +20,10 @@ from hm01.context import context
 from mincut_wrapper import MincutResult
 from pymincut.pygraph import PyGraph
 
+# (VR) Subgraphs of at most this many nodes are realized from plain lists, at that size the array passes cost more than they save
+SMALL_SUBGRAPH = 16
+
+
 def encode_to_26_ary(n):
     alphabet = 'abcdefghijklmnopqrstuvwxyz'
     result = ''
@@ -138,6 +146,11 @@ class Graph(AbstractGraph):
     def neighbors(self, u):
         yield from self._data.iterNeighbors(u)
 
+    def degrees(self) -> np.ndarray:
+        """ (VR) Degree of every node, indexed by node id """
+        scores = nk.centrality.DegreeCentrality(self._data).run().scores()
+        return np.asarray(scores, dtype=np.int64)
+
     def remove_node(self, u):
         self._data.removeNode(u)
 
@@ -177,6 +190,13 @@ class Graph(AbstractGraph):
         """ (VR) Same as above but with 'hydrated' nodes """
         return self.induced_subgraph([self.hydrator[i] for i in ids], suffix)
 
+    def compact_edges(self) -> Tuple[np.ndarray, np.ndarray]:
+        """ (VR) Compact (u, v) arrays, one entry per edge, in the order networkit writes them to an edgelist """
+        compacted = nk.graphtools.getCompactedGraph(self._data, self.continuous_ids)
+        edges = [(u, v) for u in compacted.iterNodes() for v in compacted.iterNeighbors(u) if v < u]
+        edges_arr = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        return edges_arr[:, 0], edges_arr[:, 1]
+
     def as_compact_edgelist_filepath(self):
         """ Get a filepath to the graph as a compact/continuous edgelist file """
         p = context.request_graph_related_path(self, "edgelist")
@@ -257,18 +277,218 @@ class Graph(AbstractGraph):
     def to_igraph(self):
         import igraph as ig
 
-        cont_ids = nk.graphtools.getContinuousNodeIds(self._data)
-        compact_graph = nk.graphtools.getCompactedGraph(self._data, cont_ids)
-        edges = [(u, v) for u, v in compact_graph.iterEdges()]
-        return ig.Graph(self.n(), edges)
+        # (VR) The edges are read once into an array and compacted with a lookup table, instead of building a compacted copy
+        edges = np.fromiter(chain.from_iterable(self._data.iterEdges()), dtype=np.int64, count=2 * self.m()).reshape(-1, 2)
+        compact = np.zeros(self._data.upperNodeIdBound(), dtype=np.int64)
+        compact[np.asarray(self.hydrator, dtype=np.int64)] = np.arange(self.n())
+        edges = compact[edges]
+        return ig.Graph(self.n(), list(zip(edges[:, 0].tolist(), edges[:, 1].tolist())))
+
+
+def gather_rows(indptr: np.ndarray, indices: np.ndarray,
+                selection: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ (VR) Concatenated CSR rows of the nodes in `selection`, with the length of each row """
+    starts = indptr[selection]
+    lengths = indptr[selection + 1] - starts
+    # (VR) Position of every gathered entry: the start of its row plus its offset in the row
+    offsets = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+    return lengths, indices[offsets]
+
+
+def compact_edges_to_csr(src: np.ndarray, dst: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """ (VR) Symmetric CSR with sorted rows from the (u, v) arrays of the edges """
+    keys = np.sort(np.concatenate([src * n + dst, dst * n + src]))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // n, minlength=n), out=indptr[1:])
+    return indptr, keys % n
+
+
+def induced_csr(indptr: np.ndarray, indices: np.ndarray, selection: np.ndarray,
+                member: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ (VR) CSR of the subgraph induced by the sorted node ids `selection`, relabeled to 0..len(selection)-1
+
+    The rows of the selected nodes are gathered at once and their endpoints are filtered with
+    `member`, a boolean mask over all the nodes of the graph that must be all False. The mask
+    is reset before returning so that it can be reused by the next call.
+    """
+    lengths, neighbors = gather_rows(indptr, indices, selection)
+    rows = np.repeat(np.arange(len(selection)), lengths)
+
+    member[selection] = True
+    keep = member[neighbors]
+    member[selection] = False
+
+    sub_indptr = np.zeros(len(selection) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows[keep], minlength=len(selection)), out=sub_indptr[1:])
+    return sub_indptr, np.searchsorted(selection, neighbors[keep])
+
+
+def small_induced_csr(indptr: np.ndarray, indices: np.ndarray, selection: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """ (VR) `induced_csr` for at most `SMALL_SUBGRAPH` nodes, filtering their rows as plain lists
+
+    The rows of the graph are sorted, so the filtered rows are sorted too.
+    """
+    local = dict(zip(selection, range(len(selection))))
+    sub_indptr, sub_indices = [0], []
+    for u in selection:
+        sub_indices += [local[v] for v in indices[indptr[u]:indptr[u + 1]].tolist() if v in local]
+        sub_indptr.append(len(sub_indices))
+    return np.array(sub_indptr, dtype=np.int64), np.array(sub_indices, dtype=np.int64)
+
+
+@dataclass
+class SharedCSRHandle:
+    """ (VR) Picklable reference to a CSRGraph exported to shared memory
+
+    Each array is described by its (shared memory block name, length, dtype string)
+    """
+    index: str
+    indptr: Tuple[str, int, str]
+    indices: Tuple[str, int, str]
+
+
+class CSRGraph(AbstractGraph):
+    """ (VR) Read-only graph stored as CSR numpy arrays, used as the global graph by CM
+
+    The neighbors of u are indices[indptr[u]:indptr[u + 1]], sorted and without duplicates.
+    The arrays can be exported once to shared memory so that the workers attach to them
+    without copying, whatever the multiprocessing start method.
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, index="", blocks=None):
+        self.indptr = indptr
+        self.indices = indices
+        self.index = index
+        self._blocks: List[shared_memory.SharedMemory] = blocks or []
+        self.handle: Optional[SharedCSRHandle] = None
+        self._member: Optional[np.ndarray] = None  # (VR) Reusable membership mask for `induced_csr`
+
+    @staticmethod
+    def from_edgelist(path, index=""):
+        """ (VR) Read a whitespace separated edgelist, node ids are used as-is like networkit's continuous EdgeListReader """
+        import pandas as pd
+
+        edges = pd.read_csv(
+            path, sep=r"\s+", header=None, comment="#", usecols=[0, 1], dtype=np.int64
+        ).to_numpy()
+        return CSRGraph.from_edge_array(edges, index=index)
+
+    @staticmethod
+    def from_edge_array(edges: np.ndarray, n: Optional[int] = None, index=""):
+        """ (VR) Construct from a m*2 array of (u, v) pairs, dropping self loops and parallel edges """
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        if n is None:
+            n = int(edges.max()) + 1 if len(edges) else 0
+        edges = edges[edges[:, 0] != edges[:, 1]]
+
+        # (VR) Store both directions of every edge, then sort and deduplicate them by (u, v)
+        keys = np.unique(np.concatenate([
+            edges[:, 0] * n + edges[:, 1],
+            edges[:, 1] * n + edges[:, 0],
+        ]))
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // n, minlength=n), out=indptr[1:])
+        indices = (keys % n).astype(np.int32 if n < 2**31 else np.int64)
+        return CSRGraph(indptr, indices, index)
+
+    def n(self) -> int:
+        return len(self.indptr) - 1
+
+    def m(self) -> int:
+        return len(self.indices) // 2
+
+    def nodes(self):
+        return iter(range(self.n()))
+
+    def degree(self, u) -> int:
+        return int(self.indptr[u + 1] - self.indptr[u])
+
+    def degrees(self) -> np.ndarray:
+        """ (VR) Degree of every node, indexed by node id """
+        return np.diff(self.indptr)
+
+    def neighbors(self, u):
+        yield from self.indices[self.indptr[u]:self.indptr[u + 1]].tolist()
+
+    def to_intangible(self):
+        return IntangibleSubgraph(list(self.nodes()), self.index)
+
+    def induced_csr(self, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ (VR) Local CSR of the subgraph induced by the sorted node ids `ids` """
+        if len(ids) <= SMALL_SUBGRAPH:
+            return small_induced_csr(self.indptr, self.indices, ids.tolist())
+        if self._member is None:
+            self._member = np.zeros(self.n(), dtype=bool)
+        return induced_csr(self.indptr, self.indices, ids, self._member)
+
+    def fingerprint(self) -> str:
+        """ (VR) Hash of the adjacency arrays, tells apart the networks that results were computed on """
+        digest = hashlib.sha256()
+        digest.update(self.indptr.tobytes())
+        digest.update(self.indices.tobytes())
+        return digest.hexdigest()[:16]
+
+    def to_shared_memory(self) -> CSRGraph:
+        """ (VR) Copy the arrays into shared memory and return the graph backed by them
+
+        The exporting process owns the blocks and must call `close(unlink=True)` when done.
+        """
+        blocks = []
+        arrays = []
+        for arr in (self.indptr, self.indices):
+            block = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            view = np.ndarray(arr.shape, dtype=arr.dtype, buffer=block.buf)
+            view[:] = arr
+            blocks.append(block)
+            arrays.append(view)
+        graph = CSRGraph(arrays[0], arrays[1], self.index, blocks)
+        graph.handle = SharedCSRHandle(
+            self.index,
+            (blocks[0].name, len(arrays[0]), arrays[0].dtype.str),
+            (blocks[1].name, len(arrays[1]), arrays[1].dtype.str),
+        )
+        return graph
+
+    @staticmethod
+    def from_shared_memory(handle: SharedCSRHandle) -> CSRGraph:
+        """ (VR) Attach to a graph exported by `to_shared_memory` without copying it """
+        blocks = []
+        arrays = []
+        for name, length, dtype in (handle.indptr, handle.indices):
+            block = shared_memory.SharedMemory(name=name)
+            blocks.append(block)
+            arrays.append(np.ndarray((length,), dtype=np.dtype(dtype), buffer=block.buf))
+        graph = CSRGraph(arrays[0], arrays[1], handle.index, blocks)
+        graph.handle = handle
+        return graph
+
+    def close(self, unlink: bool = False):
+        """ (VR) Detach from the shared memory blocks, and free them if `unlink` is set """
+        self.indptr = None
+        self.indices = None
+        for block in self._blocks:
+            block.close()
+            if unlink:
+                block.unlink()
+        self._blocks = []
 
 
 class RealizedSubgraph(AbstractGraph):
-    hydrator: List[int]  # (VR) mapping from compact id to original id
-    inv: Dict[int, int]  # (VR) mapping from original id to compact id
-    compacted: List[List[
-        int]]  # (VR) compacted adjacency list that maps from index to nodes adjacent to index
-    _dirty: bool  # (VR) has the graph been compacted ?
+    """ (VR) Induced subgraph stored as a local CSR adjacency over the sorted original ids
+
+    Local node i is the original node _ids[i], and its neighbors are the local nodes
+    _indices[_indptr[i]:_indptr[i + 1]]. Removing a node only clears it in the _alive mask and
+    decrements the degrees of its neighbors, the arrays are rebuilt without the removed nodes
+    the next time the graph is compacted.
+    """
+    hydrator: np.ndarray  # (VR) mapping from compact id to original id
+    inv: Optional[Dict[int, int]]  # (VR) mapping from original id to compact id, built on demand
+    _ids: np.ndarray  # (VR) sorted original ids of the local nodes, removed nodes included
+    _indptr: np.ndarray
+    _indices: np.ndarray  # (VR) local adjacency, may still point to removed nodes
+    _alive: np.ndarray  # (VR) False for the removed nodes
+    _deg: np.ndarray  # (VR) degree of each local node, counting only the alive neighbors
+    _dirty: bool  # (VR) has the graph been modified since it was compacted ?
     _graph: Graph
 
     def __init__(self,
@@ -277,86 +497,151 @@ class RealizedSubgraph(AbstractGraph):
         # Return an empty object if constructor is empty
         if intangible is None:
             return
-        """ (VR) Convert nodelist into adjacency list """
         self.index = intangible.index
-        self.nodeset = intangible.nodeset
-
-        # (VR) Construct adjacency list from the graph
-        self.adj: Dict[int, set[int]] = {}
         self._graph = graph
-        for n in self.nodeset:
-            if n not in self.adj:
-                self.adj[n] = set()
-            for m in graph.neighbors(n):
-                if m not in self.nodeset:
-                    continue
-                if m not in self.adj:
-                    self.adj[m] = set()
-                self.adj[n].add(m)
-
-        # (VR) Store the graph metrics
-        self._n = len(self.nodeset)
-        self._m = sum(len(self.adj[n]) for n in self.nodeset) // 2
-        self._dirty = True
-        # self.recompact()
+
+        # (VR) Construct the local adjacency from the graph, in one pass for the array-backed ones
+        if isinstance(graph, (CSRGraph, RealizedSubgraph)):
+            if len(intangible.subset) > SMALL_SUBGRAPH:
+                ids = np.unique(np.asarray(intangible.subset, dtype=np.int64))
+            else:
+                ids = np.array(sorted(set(intangible.subset)), dtype=np.int64)
+            self._set_csr(ids, *graph.induced_csr(ids))
+            return
+        ids = np.unique(np.asarray(intangible.subset, dtype=np.int64))
+        nodeset = set(ids.tolist())
+        rows = [sorted({v for v in graph.neighbors(u) if v in nodeset}) for u in ids.tolist()]
+        self._set_adjacency(ids, rows)
+
+    def __getstate__(self):
+        # (VR) A subgraph is sent between processes on its own, without the graph it was realized from
+        state = self.__dict__.copy()
+        state["_graph"] = None
+        state["inv"] = None
+        return state
 
     @staticmethod
     def from_adjlist(nodes, edges, cluster_id):
         subgraph = RealizedSubgraph()
-        subgraph.nodeset = nodes.copy()
-        subgraph.adj = edges
         subgraph.index = cluster_id
-        subgraph._n = len(nodes)
-        subgraph._m = sum(len(subgraph.adj[n]) for n in subgraph.nodeset) // 2
-        subgraph._dirty = True
+        subgraph._graph = None
+        ids = np.unique(np.asarray(list(nodes), dtype=np.int64))
+        subgraph._set_adjacency(ids, [sorted(set(edges[u])) for u in ids.tolist()])
+        return subgraph
+
+    @staticmethod
+    def from_csr(ids: np.ndarray, indptr: np.ndarray, indices: np.ndarray, cluster_id: str):
+        """ (VR) Subgraph over the sorted ids `ids` from a local CSR indexed by their positions """
+        subgraph = RealizedSubgraph()
+        subgraph.index = cluster_id
+        subgraph._graph = None
+        subgraph._set_csr(ids, indptr, indices)
         return subgraph
 
+    def _set_adjacency(self, ids: np.ndarray, rows: List[List[int]]):
+        """ (VR) Set the local CSR from the sorted neighbors (original ids) of each node of `ids` """
+        degrees = np.fromiter((len(r) for r in rows), dtype=np.int64, count=len(rows))
+        indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(degrees, out=indptr[1:])
+        neighbors = np.fromiter((v for r in rows for v in r), dtype=np.int64, count=int(indptr[-1]))
+        self._set_csr(ids, indptr, np.searchsorted(ids, neighbors))
+
+    def _set_csr(self, ids: np.ndarray, indptr: np.ndarray, indices: np.ndarray):
+        self._ids = ids
+        self._indptr = indptr
+        self._indices = indices
+        self._alive = np.ones(len(ids), dtype=bool)
+        self._deg = indptr[1:] - indptr[:-1]
+        self._n = len(ids)
+        self._m = len(indices) // 2
+        self.hydrator = ids
+        self.inv = None
+        self._dirty = False
+
+    def induced_csr(self, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ (VR) Local CSR of the subgraph induced by the sorted original ids `ids` """
+        if self._dirty:
+            self.recompact()
+        if len(ids) <= SMALL_SUBGRAPH:
+            inv = self.continuous_ids
+            return small_induced_csr(self._indptr, self._indices, [inv[u] for u in ids.tolist()])
+        selection = np.searchsorted(self._ids, ids)
+        found = selection < len(self._ids)
+        found[found] = self._ids[selection[found]] == ids[found]
+        if not found.all():
+            raise KeyError(int(ids[~found][0]))
+        return induced_csr(self._indptr, self._indices, selection, np.zeros(self._n, dtype=bool))
+
+    def local_csr(self) -> Tuple[np.ndarray, np.ndarray]:
+        """ (VR) Compacted local CSR, the local id i being the original node hydrator[i] """
+        if self._dirty:
+            self.recompact()
+        return self._indptr, self._indices
+
+    def remove_local_nodes(self, selection: np.ndarray):
+        """ (VR) Remove the nodes with the local ids `selection` (as given by `local_csr`) at once """
+        self._alive[selection] = False
+        rows = np.repeat(np.arange(len(self._ids)), np.diff(self._indptr))
+        keep = self._alive[rows] & self._alive[self._indices]
+        self._deg = np.bincount(rows[keep], minlength=len(self._ids))
+        self._n = int(self._alive.sum())
+        self._m = int(keep.sum()) // 2
+        self._dirty = True
+
+    def _local(self, u) -> int:
+        """ (VR) Local id of the original node u """
+        i = int(np.searchsorted(self._ids, u))
+        if i == len(self._ids) or self._ids[i] != u or not self._alive[i]:
+            raise KeyError(u)
+        return i
+
     def recompact(self):
-        """ (VR) When the graph is modified, reconstruct the compacted adjacency list """
-        unallocated = 0
-        hydrator: List[int] = []
-        inv: Dict[int, int] = {}
-        compacted: List[List[int]] = []
-
-        for n in self.nodeset:
-            if n not in inv:
-                hydrator.append(
-                    n
-                )  # (VR) Allocate new compacted id and reflect the changes in the adj list
-                inv[n] = unallocated
-                compacted.append([])
-                unallocated += 1
-            for m in self.adj[n]:
-                if m not in inv:
-                    hydrator.append(m)
-                    inv[m] = unallocated
-                    compacted.append([])
-                    unallocated += 1
-                compacted[inv[n]].append(
-                    inv[m]
-                )  # (VR) Add m to be adjacent to n in the compacted adj list
-        assert len(hydrator) == len(inv)
-        self.hydrator = hydrator
-        self.inv = inv
-        self.compacted = compacted
-        self._dirty = False  # (VR) Set dirty to be false since the graph was compacted
+        """ (VR) When the graph is modified, rebuild the local CSR without the removed nodes """
+        alive = self._alive
+        rows = np.repeat(np.arange(len(alive)), np.diff(self._indptr))
+        keep = alive[rows] & alive[self._indices]
+        new_id = np.cumsum(alive) - 1
+        src = new_id[rows[keep]]
+        indptr = np.zeros(self._n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=self._n), out=indptr[1:])
+        self._set_csr(self._ids[alive], indptr, new_id[self._indices[keep]])
+
+    def compact_edges(self) -> Tuple[np.ndarray, np.ndarray]:
+        """ (VR) Compact (u, v) arrays with u < v, one entry per edge, in the order they are written to an edgelist """
+        return self._compact_edges()
+
+    def _compact_edges(self) -> Tuple[np.ndarray, np.ndarray]:
+        """ (VR) Compact (u, v) arrays with u < v, one entry per edge """
+        if self._dirty:
+            self.recompact()
+        src = np.repeat(np.arange(self._n), np.diff(self._indptr))
+        upper = src < self._indices
+        return src[upper], self._indices[upper]
+
+    @property
+    def nodeset(self):
+        return set(self.nodes())
 
     def degree(self, u) -> int:
-        return len(self.adj[u])
+        return int(self._deg[self._local(u)])
 
     def neighbors(self, u) -> Iterator[int]:
-        yield from self.adj[u]
+        i = self._local(u)
+        nbrs = self._indices[self._indptr[i]:self._indptr[i + 1]]
+        yield from self._ids[nbrs[self._alive[nbrs]]].tolist()
 
     def to_intangible(self, graph):
-        return IntangibleSubgraph(list(self.nodeset), self.index)
+        return IntangibleSubgraph(list(self.nodes()), self.index)
 
     def remove_node(self, u: int):
-        self._n -= 1  # (VR) Adjust node count and adj list
-        self._m -= len(self.adj[u])
-        for v in self.adj[u]:
-            self.adj[v].remove(u)
-        del self.adj[u]
-        self.nodeset.remove(u)
+        i = self._local(u)
+        nbrs = self._indices[self._indptr[i]:self._indptr[i + 1]]
+        nbrs = nbrs[self._alive[nbrs]]
+        self._n -= 1  # (VR) Adjust node count and degrees
+        self._m -= len(nbrs)
+        self._deg[nbrs] -= 1
+        self._deg[i] = 0
+        self._alive[i] = False
         self._dirty = True  # (VR) The graph needs to be recompacted so set dirty to true
 
     def n(self):
@@ -366,96 +651,158 @@ class RealizedSubgraph(AbstractGraph):
         return self._m
 
     def nodes(self):
-        yield from self.nodeset
+        if self._dirty:
+            yield from self._ids[self._alive].tolist()
+        else:
+            yield from self._ids.tolist()
 
-    @cache
     def mcd(self) -> int:
         """ Get the minimum degree in the graph """
         if self.n() == 0:
             return 0
-        return min(self.degree(n) for n in self.nodes())
+        return int(self._deg[self._alive].min())
 
-    def to_igraph(self):
+    def intangible_subgraph_from_compact(self, ids: List[int], suffix: str):
         if self._dirty:
             self.recompact()
+        return self.intangible_subgraph(
+            self.hydrator[np.asarray(ids, dtype=np.int64)].tolist(), suffix)
+
+    def to_igraph(self):
         import igraph as ig
 
-        edges = []
-        for u in self.nodes():
-            for v in self.adj[u]:
-                if u > v:
-                    continue
-                edges.append((self.inv[u], self.inv[v]))
-        return ig.Graph(self.n(), edges)
+        src, dst = self._compact_edges()
+        return ig.Graph(self.n(), list(zip(src.tolist(), dst.tolist())))
 
     def as_metis_filepath(self):
         if self._dirty:  # (VR) METIS requires compact node ids
             self.recompact()
         p = context.request_graph_related_path(self, "metis")
+        indptr = self._indptr.tolist()
+        indices = (self._indices + 1).tolist()
         with open(p, "w+") as f:
             f.write(f"{self.n()} {self.m()}\n")
-            for u in self.compacted:
-                f.write(" ".join([str(v + 1) for v in u]) + "\n")
+            for u in range(self.n()):
+                f.write(" ".join(map(str, indices[indptr[u]:indptr[u + 1]])) + "\n")
         return p
 
     def as_compact_edgelist_filepath(self):
-        if self._dirty:
-            self.recompact()
+        src, dst = self._compact_edges()
         p = context.request_graph_related_path(self, "edgelist")
         with open(p, "w+") as f:
-            for u, adj in enumerate(self.compacted):
-                for v in adj:
-                    if u < v:
-                        f.write(f"{u}\t{v}\n")
+            for u, v in zip(src.tolist(), dst.tolist()):
+                f.write(f"{u}\t{v}\n")
         return p
 
     def as_compact_abc_edgelist_filepath(self):
-        if self._dirty:
-            self.recompact()
+        src, dst = self._compact_edges()
         p = context.request_graph_related_path(self, "abc_edgelist")
         with open(p, "w+") as f:
-            for u, adj in enumerate(self.compacted):
-                for v in adj:
-                    if u < v:
-                        f.write(f"{u}\t{v}\t1\n")
+            for u, v in zip(src.tolist(), dst.tolist()):
+                f.write(f"{u}\t{v}\t1\n")
         return p
 
 
-    def find_mincut(self) -> MincutResult:
-        """ (VR) Compute mincut via the wrapped VieCut """
+    def find_mincut(self, threshold: Optional[float] = None) -> MincutResult:
+        """ (VR) Compute mincut via the wrapped VieCut
+
+        If a threshold is given, the cut is first decided on a sparse certificate: a cut above the
+        threshold is then only a lower bound of the mincut, a cut at or below it is exact.
+        """
+        if threshold is not None:
+            return mincut.certified_mincut(self, threshold)
         return mincut.viecut(self)
 
+    def sparse_certificate(self, k: int) -> RealizedSubgraph:
+        """ (VR) Sparse k-certificate: the union of k successive maximal spanning forests (Nagamochi-Ibaraki)
+
+        Every cut of the graph keeps at least min(its size, k) edges in the certificate, which has
+        at most k(n - 1) edges. The forests are minimum spanning forests on the edge positions, so
+        that they are deterministic and tell which edges they use.
+        """
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import minimum_spanning_tree
+
+        src, dst = self._compact_edges()
+        remaining = np.ones(len(src), dtype=bool)
+        for _ in range(k):
+            edges = np.flatnonzero(remaining)
+            if not len(edges):
+                break
+            weights = csr_matrix((edges + 1.0, (src[edges], dst[edges])), shape=(self._n, self._n))
+            forest = minimum_spanning_tree(weights)
+            remaining[forest.data.astype(np.int64) - 1] = False
+        kept = ~remaining
+
+        certificate = RealizedSubgraph()
+        certificate.index = self.index
+        certificate._graph = self._graph
+        certificate._set_csr(self._ids, *compact_edges_to_csr(src[kept], dst[kept], self._n))
+        return certificate
+
     def cut_by_mincut(
         self, mincut_res: MincutResult
     ) -> Tuple[Union[Graph, RealizedSubgraph], Union[Graph, RealizedSubgraph]]:
-        """Cut the graph by the mincut result"""
+        """Cut the graph by the mincut result
+
+        (VR) The sides are split off the local adjacency of this graph, the global graph is not visited again
+        """
+        if self._dirty:
+            self.recompact()
         partitions = []
+        member = np.zeros(self._n, dtype=bool)
 
         for i, partition in enumerate(mincut_res):
             if i < len(mincut_res) - 1:
-                partitions.append(RealizedSubgraph(
-                    IntangibleSubgraph(
-                        partition,
-                        self.index + encode_to_26_ary(i+1)
-                    ),
-                    self._graph
+                selection = np.searchsorted(self._ids, np.sort(np.asarray(partition, dtype=np.int64)))
+                partitions.append(self.subgraph_from_local(
+                    selection,
+                    self.index + encode_to_26_ary(i+1),
+                    member
                 ))
 
         return partitions
+
+    def split_by_labels(self, labels: np.ndarray, count: int) -> List[RealizedSubgraph]:
+        """ (VR) Split the (compacted) graph into the subgraphs induced by each label 0..count-1
+
+        The part with label i gets the same suffix as the i-th side of a mincut
+        """
+        member = np.zeros(self._n, dtype=bool)
+        order = np.argsort(labels, kind="stable")
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=count))])
+        return [
+            self.subgraph_from_local(order[bounds[i]:bounds[i + 1]], self.index + encode_to_26_ary(i+1), member)
+            for i in range(count)
+        ]
+
+    def subgraph_from_local(self, selection: np.ndarray, index: str,
+                            member: Optional[np.ndarray] = None) -> RealizedSubgraph:
+        """ (VR) Subgraph induced by the sorted local ids `selection` of this (compacted) graph """
+        if member is None:
+            member = np.zeros(self._n, dtype=bool)
+        subgraph = RealizedSubgraph()
+        subgraph.index = index
+        subgraph._graph = self._graph
+        subgraph._set_csr(self._ids[selection],
+                          *induced_csr(self._indptr, self._indices, selection, member))
+        return subgraph
     
     def internal_degree(self, u, graph: Graph) -> int:
-        return sum(1 for v in graph._data.iterNeighbors(u) if v in self.nodeset)
+        nodeset = self.nodeset
+        return sum(1 for v in graph.neighbors(u) if v in nodeset)
 
     def get_border_edges(self, graph: Graph):
         ret = 0
-        for v in self.nodeset:
-            neighbors = sum(1 for u in graph.neighbors(v) if u not in self.nodeset)
+        nodeset = self.nodeset
+        for v in nodeset:
+            neighbors = sum(1 for u in graph.neighbors(v) if u not in nodeset)
             ret += neighbors
         return ret
 
     def conductance(self, graph):
         num = self.get_border_edges(graph)
-        deg_sum = sum(graph.degree(v) for v in self.nodeset)
+        deg_sum = sum(graph.degree(v) for v in self.nodes())
         den = min(deg_sum, 2*graph.m() - deg_sum)
         return num/den
 
@@ -463,29 +810,34 @@ class RealizedSubgraph(AbstractGraph):
     def continuous_ids(self):
         if self._dirty:
             self.recompact()
+        if self.inv is None:
+            self.inv = dict(zip(self._ids.tolist(), range(self._n)))
         return self.inv
 
     def as_pygraph(self):
-        edges = []
-        nodes = list(self.nodeset)
-        for u in nodes:
-            for v in self.adj[u]:
-                edges.append((u, v))
-        return PyGraph(nodes, edges)
-    
-    def as_compact_networkit(self):
-        # Recompact nodes if they are not currently
+        """ (VR) PyGraph over the compacted ids 0..n-1, its partitions are mapped back through the hydrator
+
+        The wrapper takes Python lists, so both directions of every edge are converted from the
+        local CSR in one pass, or row by row from plain lists for small subgraphs.
+        """
         if self._dirty:
             self.recompact()
-
+        if self._n <= SMALL_SUBGRAPH:
+            indptr, indices = self._indptr.tolist(), self._indices.tolist()
+            edges = [(u, v) for u in range(self._n) for v in indices[indptr[u]:indptr[u + 1]]]
+        else:
+            src = np.repeat(np.arange(self._n, dtype=np.int64), np.diff(self._indptr))
+            edges = list(zip(src.tolist(), self._indices.tolist()))
+        return PyGraph(list(range(self._n)), edges)
+    
+    def as_compact_networkit(self):
         # Initialize an empty graph
         graph = nk.Graph(n=self.n())
         
         # Add edges in the graph
-        for u, adj in enumerate(self.compacted):
-            for v in adj:
-                if u < v:
-                    graph.addEdge(u, v)
+        src, dst = self._compact_edges()
+        for u, v in zip(src.tolist(), dst.tolist()):
+            graph.addEdge(u, v)
 
         # Preprocess the graph (e.g., compute properties, sort edges, etc.)
         graph.indexEdges()
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from typing import List, Tuple
+
+import numpy as np
+
+from hm01.connectivity import connected_components
+from hm01.graph import RealizedSubgraph, encode_to_26_ary, gather_rows
+
+
+def k_core(graph: RealizedSubgraph, k: int) -> int:
+    """ (VR) Remove the vertices of degree < k until there are none left, returns the number removed
+
+    The k-core does not depend on the removal order, so the vertices are peeled in batches.
+    """
+    indptr, indices = graph.local_csr()
+    degrees = np.diff(indptr)
+    alive = np.ones(len(degrees), dtype=bool)
+    frontier = np.flatnonzero(degrees < k)
+    while len(frontier):
+        alive[frontier] = False
+        _, neighbors = gather_rows(indptr, indices, frontier)
+        neighbors = neighbors[alive[neighbors]]
+        np.subtract.at(degrees, neighbors, 1)
+        frontier = np.unique(neighbors)
+        frontier = frontier[degrees[frontier] < k]
+    removed = np.flatnonzero(~alive)
+    if len(removed):
+        graph.remove_local_nodes(removed)
+    return len(removed)
+
+
+def k_edge_connected_components(
+    graph: RealizedSubgraph, k: int
+) -> Tuple[List[Tuple[RealizedSubgraph, int]], int]:
+    """ (VR) Maximal k-edge-connected subgraphs of a graph, by cut-based decomposition
+
+    Each part is reduced to its k-core and split into its connected components. A component
+    whose mincut is at least k is k-edge-connected, otherwise it is split along its mincut and
+    both sides are decomposed again. No edge of a cut smaller than k can be inside a k-edge-
+    connected subgraph, so the maximal ones are never broken.
+
+    The graph itself is reduced to its k-core in place.
+
+    Returns: the components (with at least two nodes) and their mincut, named by the index of
+    the graph followed by their rank by increasing size (unless the graph is k-edge-connected
+    itself); and the mincut of the k-core of the graph (0 if it is disconnected)
+    """
+    pieces: List[Tuple[RealizedSubgraph, int]] = []
+    top_cut = None
+    work = [graph]
+    while work:
+        part = work.pop()
+        k_core(part, k)
+        num_components, labels = connected_components(part)
+        if part is graph and num_components > 1:
+            top_cut = 0
+        components = part.split_by_labels(labels, num_components) if num_components > 1 else [part]
+        for component in components:
+            if component.n() < 2:
+                continue
+            cut_result = component.find_mincut()
+            if top_cut is None:
+                top_cut = cut_result[-1]
+            if cut_result[-1] >= k:
+                pieces.append((component, cut_result[-1]))
+            else:
+                work.extend(component.cut_by_mincut(cut_result))
+
+    if len(pieces) == 1 and pieces[0][0] is graph:
+        return pieces, top_cut
+
+    pieces.sort(key=lambda piece: piece[0].n())
+    for i, (piece, _) in enumerate(pieces):
+        piece.index = graph.index + encode_to_26_ary(i + 1)
+    return pieces, top_cut if top_cut is not None else 0
@@ -1,29 +1,262 @@
 # from mincut_wrapper import MincutResult
+import math
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import depth_first_order
+
+
+# (VR) VieCut algorithms: Nagamochi-Ibaraki, Karger-Stein, Matula's approximation, Padberg-Rinaldi,
+# the cactus of all mincuts (the only one that can return the most balanced cut) and the inexact VieCut
+ALGORITHMS = ("noi", "ks", "matula", "pr", "cactus", "vc")
+QUEUES = ("bqueue", "bstack", "heap")
+STOER_WAGNER = "stoer_wagner"       # (VR) In-process exact mincut for small clusters, see `stoer_wagner_batch`
+
+
+@dataclass
+class MincutConfig:
+    """ (VR) Mincut algorithm selection, set once from the CLI
+
+    With the "auto" algorithm, small clusters are cut in process with a batched Stoer-Wagner,
+    giant ones with the inexact VieCut, and the rest with the cactus algorithm.
+    """
+    algorithm: str = "cactus"
+    queue_implementation: str = "bqueue"
+    balanced: bool = True
+    small_n: int = 64               # (VR) auto: clusters with at most this many nodes are cut with Stoer-Wagner
+    large_m: int = 10_000_000       # (VR) auto: clusters with at least this many edges are cut with vc
+
+    def select(self, n: int, m: int) -> str:
+        """ (VR) Algorithm used to cut a cluster of n nodes and m edges """
+        if self.algorithm != "auto":
+            return self.algorithm
+        if n <= self.small_n:
+            return STOER_WAGNER
+        if m >= self.large_m:
+            return "vc"
+        return "cactus"
+
+
+config = MincutConfig()
+
+
+class CutResult(tuple):
+    """ (VR) Mincut result (light partition, heavy partition, cut size) that also records how it was found
+
+    Indexes like the list returned by VieCut, so `res[-1]` is still the cut size
+    """
+
+    def __new__(cls, light: List[int], heavy: List[int], cut_size: int, algorithm: str):
+        res = super().__new__(cls, (light, heavy, cut_size))
+        res.algorithm = algorithm
+        return res
+
+    def __getnewargs__(self):
+        return (*self, self.algorithm)
 
 
 def viecut(graph):
     """ (VR) Compute the mincut result via VieCut """
+    cut_result = known_mincut(graph)
+    if cut_result is not None:
+        return cut_result
+    algorithm = config.select(graph.n(), graph.m())
+    if algorithm == STOER_WAGNER and hasattr(graph, "local_csr"):
+        return stoer_wagner_batch([graph])[0]
+    if algorithm == STOER_WAGNER:
+        algorithm = "noi"
+    pygraph = graph.as_pygraph()
+    light, heavy, cut_size = run_viecut_command(pygraph, algorithm)
+    # (VR) The PyGraph has compacted ids, one gather maps each side back
+    hydrator = np.asarray(graph.hydrator)
+    return CutResult(
+        hydrator[np.asarray(light, dtype=np.int64)].tolist(),
+        hydrator[np.asarray(heavy, dtype=np.int64)].tolist(),
+        cut_size,
+        algorithm,
+    )
+
+
+def known_mincut(graph) -> Optional[CutResult]:
+    """ (VR) The mincut of a single edge or of a shape with a closed form mincut, None for any other graph """
     if graph.n() == 2 and graph.m() == 1:
         # (VR) If we have a single edge, save the effort by splitting it
         nodes = list(graph.nodes())
-        return [nodes[0]], [nodes[1]], 1
-    pygraph = graph.as_pygraph()
-    cut_result = run_viecut_command(pygraph)
-    return cut_result
+        return CutResult([nodes[0]], [nodes[1]], 1, "single_edge")
+    if hasattr(graph, "local_csr"):
+        # (VR) Some shapes have a mincut known in closed form, skip VieCut for them
+        return closed_form_mincut(graph)
+    return None
+
+
+def batch_mincut(graphs: List, batch_size: int = 256) -> List[CutResult]:
+    """ (VR) Exact mincuts of many small (realized) graphs, computed together by size
+
+    The graphs are sorted by size so that each call to `stoer_wagner_batch` pads them little.
+    """
+    results: List[Optional[CutResult]] = [known_mincut(graph) for graph in graphs]
+    remaining = sorted((i for i, res in enumerate(results) if res is None), key=lambda i: graphs[i].n())
+    for start in range(0, len(remaining), batch_size):
+        chunk = remaining[start:start + batch_size]
+        for i, res in zip(chunk, stoer_wagner_batch([graphs[i] for i in chunk])):
+            results[i] = res
+    return results
+
+
+def stoer_wagner_batch(graphs: List) -> List[CutResult]:
+    """ (VR) Exact mincuts of several graphs at once, by Stoer-Wagner over padded dense adjacency matrices
+
+    Each step of the maximum adjacency orderings, and each merge of the last two vertices of a
+    phase, is done for all the graphs with one numpy operation. The padding vertices are never
+    active. Costs O(N^3) per graph of N nodes, so this is only meant for small graphs. The cut is
+    the first minimum found, not necessarily the most balanced one.
+    """
+    count = len(graphs)
+    size = max(graph.n() for graph in graphs)
+    rows = np.arange(count)
+    weights = np.zeros((count, size, size), dtype=np.int64)
+    active = np.zeros((count, size), dtype=bool)
+    for i, graph in enumerate(graphs):
+        indptr, indices = graph.local_csr()
+        weights[i, np.repeat(np.arange(graph.n()), np.diff(indptr)), indices] = 1
+        active[i, :graph.n()] = True
+    # (VR) groups[i, v] are the original vertices merged into v
+    groups = np.repeat(np.eye(size, dtype=bool)[np.newaxis], count, axis=0)
+    best = np.full(count, np.iinfo(np.int64).max)
+    best_side = np.zeros((count, size), dtype=bool)
+
+    for _ in range(size - 1):
+        running = active.sum(axis=1) >= 2
+        if not running.any():
+            break
+        # (VR) Maximum adjacency ordering, from the first active vertex
+        first = np.argmax(active, axis=1)
+        added = np.zeros((count, size), dtype=bool)
+        added[rows, first] = True
+        connection = weights[rows, first]
+        s = first.copy()
+        t = first.copy()
+        phase_cut = np.zeros(count, dtype=np.int64)
+        for _ in range(size - 1):
+            candidates = active & ~added
+            stepping = candidates.any(axis=1)
+            if not stepping.any():
+                break
+            nxt = np.argmax(np.where(candidates, connection, -1), axis=1)
+            s = np.where(stepping, t, s)
+            t = np.where(stepping, nxt, t)
+            phase_cut = np.where(stepping, connection[rows, nxt], phase_cut)
+            added[rows[stepping], nxt[stepping]] = True
+            connection[stepping] += weights[rows[stepping], nxt[stepping]]
+
+        # (VR) The cut of the phase separates the last vertex from the others
+        improved = running & (phase_cut < best)
+        best[improved] = phase_cut[improved]
+        best_side[improved] = groups[rows[improved], t[improved]]
+
+        # (VR) Merge the last vertex into the one before
+        r, u, v = rows[running], s[running], t[running]
+        weights[r, u] += weights[r, v]
+        weights[r, :, u] += weights[r, :, v]
+        weights[r, u, u] = 0
+        weights[r, v] = 0
+        weights[r, :, v] = 0
+        active[r, v] = False
+        groups[r, u] |= groups[r, v]
+
+    results = []
+    for i, graph in enumerate(graphs):
+        side = best_side[i, :graph.n()]
+        if 2 * side.sum() > graph.n():
+            side = ~side
+        hydrator = np.asarray(graph.hydrator)
+        results.append(CutResult(hydrator[side].tolist(), hydrator[~side].tolist(), int(best[i]), STOER_WAGNER))
+    return results
+
+
+def certified_mincut(graph, threshold: float) -> CutResult:
+    """ (VR) Compute the mincut on a sparse certificate of the graph, deciding whether it is above the threshold
+
+    With k = floor(threshold) + 1, every cut of the graph keeps min(its size, k) edges in the
+    k-certificate. So if the mincut of the certificate is at least k, so is the mincut of the graph,
+    and the returned cut size is then a lower bound above the threshold. Otherwise both have the
+    same minimum cuts, and the certificate's cut (on the same nodes) is returned as the graph's.
+    """
+    cut_result = closed_form_mincut(graph)
+    if cut_result is not None:
+        return cut_result
+    k = math.floor(threshold) + 1
+    if graph.n() > 2 and graph.m() > k * (graph.n() - 1):
+        cut_result = viecut(graph.sparse_certificate(k))
+        if cut_result[-1] >= k:
+            return CutResult(*cut_result[:2], cut_result[-1], "certificate")
+        return cut_result
+    return viecut(graph)
+
+
+def closed_form_mincut(graph) -> Optional[CutResult]:
+    """ (VR) The most balanced mincut of trees, cycles and dense graphs, None for any other graph
+
+    - If 2 * mcd > n, every cut that is not a single vertex has more than mcd edges, so the
+      mincut is a vertex of minimum degree (this covers the cliques)
+    - A tree is cut at the edge that splits it most evenly (this covers the stars)
+    - A cycle is cut in two arcs of n // 2 and n - n // 2 nodes
+    """
+    n = graph.n()
+    m = graph.m()
+    if n < 3:
+        return None
+    indptr, indices = graph.local_csr()
+    hydrator = graph.hydrator
+    degrees = np.diff(indptr)
+
+    mcd = int(degrees.min())
+    if 2 * mcd > n:
+        u = int(np.argmin(degrees))
+        return CutResult(
+            [int(hydrator[u])], np.delete(hydrator, u).tolist(), mcd, "min_degree")
+
+    is_tree = m == n - 1
+    is_cycle = m == n and int(degrees.max()) == 2
+    if not is_tree and not is_cycle:
+        return None
+
+    # (VR) Both shapes are only recognized if the graph is connected, the depth-first order tells
+    adjacency = csr_matrix((np.ones(len(indices), dtype=np.int8), indices, indptr), shape=(n, n))
+    order, predecessors = depth_first_order(adjacency, 0, directed=False)
+    if len(order) < n:
+        return None
+
+    if is_cycle:
+        # (VR) The depth-first order of a cycle walks around it
+        return CutResult(
+            hydrator[order[:n // 2]].tolist(), hydrator[order[n // 2:]].tolist(), 2, "cycle")
+
+    # (VR) Subtree sizes from the leaves up, a subtree is contiguous in the (preorder) depth-first order
+    sizes = [1] * n
+    parents = predecessors.tolist()
+    for v in order[:0:-1].tolist():
+        sizes[parents[v]] += sizes[v]
+    subtree_sizes = np.asarray(sizes)[order[1:]]
+    best = int(np.argmin(np.abs(n - 2 * subtree_sizes))) + 1
+    size = int(subtree_sizes[best - 1])
+    subtree = np.zeros(n, dtype=bool)
+    subtree[order[best:best + size]] = True
+    light, heavy = (subtree, ~subtree) if 2 * size <= n else (~subtree, subtree)
+    return CutResult(hydrator[light].tolist(), hydrator[heavy].tolist(), 1, "tree")
 
 
-def run_viecut_command(pygraph):
+def run_viecut_command(pygraph, algorithm: Optional[str] = None):
     """ (VR) Run the viecut command and return the mincut result object """
-    algorithm = 'cactus'  # (VR) Mincut algorithm from Nagamochi et. al.
-    queue_implementation = 'bqueue'
-    balanced = True
+    if algorithm is None:
+        algorithm = config.algorithm if config.algorithm != "auto" else "cactus"
 
-    # light_partition, heavy_partition, cut_size = 
-    
-    return pygraph.mincut(
+    light_partition, heavy_partition, cut_size = pygraph.mincut(
         algorithm,
-        queue_implementation,
-        balanced,
+        config.queue_implementation,
+        config.balanced,
     )
 
-    # return MincutResult(light_partition, heavy_partition, cut_size)
\ No newline at end of file
+    return CutResult(light_partition, heavy_partition, cut_size, algorithm)
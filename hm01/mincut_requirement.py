@@ -5,6 +5,8 @@ from typing import Optional
 
 import math
 
+import numpy as np
+
 from hm01.clusterers.abstract_clusterer import AbstractClusterer
 from hm01.clusterers.ikc_wrapper import IkcClusterer
 
@@ -40,11 +42,21 @@ class MincutRequirement:
         self, clusterer: AbstractClusterer, cluster, mcd_override: Optional[int] = None
     ) -> float:
         """ (VR) Compute the threshold of a given clusterer """
-        log10 = math.log10(cluster.n()) if cluster.n() > 0 else 0
         mcd = cluster.mcd() if mcd_override is None else mcd_override
+        return self.validity_threshold_at(clusterer, cluster.n(), mcd)
+
+    def validity_threshold_at(self, clusterer: AbstractClusterer, n: int, mcd: float) -> float:
+        """ (VR) Threshold of a cluster of n nodes with minimum degree mcd, without building the cluster """
+        log10 = math.log10(n) if n > 0 else 0
         k = clusterer.k if isinstance(clusterer, IkcClusterer) else 0           # (VR) k is dependent on the clusterer being IKC
         return self.log10 * log10 + self.mcd * mcd + self.k * k + self.constant 
 
+    def validity_thresholds(self, clusterer: AbstractClusterer, n: np.ndarray, mcd: np.ndarray) -> np.ndarray:
+        """ (VR) Vectorized `validity_threshold_at` over arrays of cluster sizes and minimum degrees """
+        log10 = np.log10(np.maximum(n, 1))
+        k = clusterer.k if isinstance(clusterer, IkcClusterer) else 0
+        return self.log10 * log10 + self.mcd * mcd + self.k * k + self.constant
+
     @staticmethod
     def most_stringent() -> MincutRequirement:
         return MincutRequirement(0, 0, 0, 2)
@@ -1,8 +1,11 @@
 from __future__ import annotations
-from hm01.graph import RealizedSubgraph
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from hm01.graph import CSRGraph, IntangibleSubgraph, RealizedSubgraph, gather_rows
 from hm01.mincut_requirement import MincutRequirement
 from hm01.clusterers.abstract_clusterer import AbstractClusterer
-from heapdict import heapdict
 
 
 def prune_graph(
@@ -13,6 +16,9 @@ def prune_graph(
     """ (VR) This stage comes before the mincut stage for each cluster. 
     Remove the single vertices that have degrees lower than the mincut requirement until there exists no such vertices.
 
+    The vertices are peeled by increasing degree from a bucket queue over the local CSR (O(n + m)), and
+    the pruned ones are removed from the graph in a single batch at the end.
+
     Params:
         graph (RealizedSubgraph)                        : Graph to prune
         connectivity_requirement (MincutRequirement)    : the mincut requirement
@@ -21,28 +27,159 @@ def prune_graph(
     mcd = graph.mcd()
     if mcd > connectivity_requirement.validity_threshold(clusterer, graph): # (VR) If the mcd fits the threshold, no need to prune
         return 0
-    
-    deleted_nodes = 0                                                       # (VR) Keep count of the number of pruned nodes
 
-    degrees = heapdict()                                                    # (VR) Heapdict automatically goes smallest to largest
-    for node in graph.nodes():
-        degrees[node] = graph.degree(node)
+    indptr_arr, indices_arr = graph.local_csr()
+    indptr = indptr_arr.tolist()
+    indices = indices_arr.tolist()
+    degrees = np.diff(indptr_arr).tolist()
+    size = len(degrees)
+
+    buckets: List[List[int]] = [[] for _ in range(max(degrees) + 1)]    # (VR) buckets[d] holds the vertices whose degree became d
+    for u, degree in enumerate(degrees):
+        buckets[degree].append(u)
+
+    min_sizes: Dict[int, int] = {}
+    def min_size(degree: int) -> int:
+        """ (VR) Smallest graph size at which a vertex of this degree still fails the threshold
+
+        The threshold does not decrease with the size, so it is found by bisection, once per degree.
+        """
+        if degree not in min_sizes:
+            lo, hi = 1, len(degrees) + 1
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if degree > connectivity_requirement.validity_threshold_at(clusterer, mid, degree):
+                    lo = mid + 1
+                else:
+                    hi = mid
+            min_sizes[degree] = lo
+        return min_sizes[degree]
 
-    while degrees:
-        node, degree = degrees.popitem()
-        if degree > connectivity_requirement.validity_threshold(            # (VR) If we hit a degree that fits the threshold, no need to prune
-            clusterer, graph, mcd_override=degree
-        ):
+    removed = [False] * size
+    deleted_nodes = 0                                                       # (VR) Keep count of the number of pruned nodes
+    level = 0
+    while size > 0:
+        while not buckets[level]:
+            level += 1
+        node = buckets[level].pop()
+        if removed[node] or degrees[node] != level:                         # (VR) Stale entry, the vertex was moved to a lower bucket
+            continue
+        if size < min_size(level):                                          # (VR) If we hit a degree that fits the threshold, no need to prune
             break
 
-        for neighbor in graph.neighbors(node):                              # (VR) Otherwise, adjust degrees and pop the node from the graph
-            if neighbor in degrees:
-                degrees[neighbor] -= 1
-            else:
-                # This else case should be not needed, but still kept here for defensive programming
-                degrees[neighbor] = graph.degree(neighbor) - 1
-        graph.remove_node(node)
+        removed[node] = True                                                # (VR) Otherwise, adjust degrees and pop the node from the graph
+        size -= 1
         deleted_nodes += 1                                                  # (VR) Increment the number of pruned nodes
+        for neighbor in indices[indptr[node]:indptr[node + 1]]:
+            if not removed[neighbor]:
+                degrees[neighbor] -= 1
+                buckets[degrees[neighbor]].append(neighbor)
+                level = min(level, degrees[neighbor])
 
-    graph.mcd.cache_clear()
+    if deleted_nodes:
+        graph.remove_local_nodes(np.flatnonzero(removed))
     return deleted_nodes
+
+
+def prune_clusters(
+    graph: CSRGraph,
+    clusters: List[IntangibleSubgraph],
+    connectivity_requirement: MincutRequirement,
+    clusterer: AbstractClusterer,
+    max_rounds: int = 256,
+) -> Dict[int, Tuple[np.ndarray, int]]:
+    """ (VR) Prune all the clusters at once over the global CSR, before they are dispatched
+
+    The intra-cluster degrees of every node are computed in one pass over the edges, then each
+    cluster is peeled level by level: at its current minimum degree d, the whole set of vertices
+    that reach degree <= d is removed (the complement of the (d+1)-core). `prune_graph` pops exactly
+    these vertices, in whatever order, as long as the last pop passes the threshold, which it
+    does if d passes it at the smallest size of the level since the threshold does not decrease
+    with the size and its validity does not increase with the degree. Clusters where this check
+    fails, or that are still peeling after `max_rounds` rounds, are left to `prune_graph`.
+
+    Returns: for each pruned cluster (by position) with at least two nodes left, its remaining
+    nodes and its minimum degree before pruning
+    """
+    def passes(n: np.ndarray, degree: np.ndarray) -> np.ndarray:
+        """ (VR) Does a vertex of this degree get pruned from a cluster of size n ? """
+        thresholds = connectivity_requirement.validity_thresholds(clusterer, n, degree)
+        res = degree <= thresholds
+        # (VR) Settle the near-ties with the scalar threshold so that the decision matches prune_graph exactly
+        for i in np.flatnonzero(np.abs(degree - thresholds) < 1e-9):
+            res[i] = degree[i] <= connectivity_requirement.validity_threshold_at(clusterer, int(n[i]), int(degree[i]))
+        return res
+
+    num_nodes = graph.n()
+    num_clusters = len(clusters)
+    sizes = np.fromiter((len(c.subset) for c in clusters), dtype=np.int64, count=num_clusters)
+    nodes = np.concatenate([np.asarray(c.subset, dtype=np.int64) for c in clusters]) if num_clusters else np.zeros(0, dtype=np.int64)
+    owner = np.repeat(np.arange(num_clusters), sizes)
+
+    # (VR) Nodes that appear more than once (in overlapping clusters or twice in a cluster) disqualify their clusters
+    eligible = np.ones(num_clusters, dtype=bool)
+    eligible[owner[np.bincount(nodes, minlength=num_nodes)[nodes] > 1]] = False
+    member = np.full(num_nodes, -1, dtype=np.int64)
+    member[nodes[eligible[owner]]] = owner[eligible[owner]]
+
+    # (VR) Intra-cluster degree of every node in one pass over the edges
+    src = np.repeat(np.arange(num_nodes), np.diff(graph.indptr))
+    intra = member[src] >= 0
+    intra[intra] = member[src[intra]] == member[graph.indices[intra]]
+    degrees = np.bincount(src[intra], minlength=num_nodes)
+    del src, intra
+
+    alive = member >= 0
+    n = np.bincount(member[alive], minlength=num_clusters)
+    mcd = np.full(num_clusters, np.iinfo(np.int64).max)
+    np.minimum.at(mcd, member[alive], degrees[alive])
+    original_mcd = mcd.copy()
+
+    active = eligible & (n > 0)
+    active[active] = passes(n[active], mcd[active])
+    unresolved = np.zeros(num_clusters, dtype=bool)     # (VR) Clusters left to prune_graph
+    pruned = np.zeros(num_clusters, dtype=bool)
+    rounds = 0
+    while active.any():
+        # (VR) Peel the vertices of degree <= level of each active cluster, and the ones that drop to it
+        level = mcd
+        frontier = np.flatnonzero(alive & (member >= 0))
+        frontier = frontier[active[member[frontier]]]
+        frontier = frontier[degrees[frontier] <= level[member[frontier]]]
+        removed = np.zeros(num_clusters, dtype=np.int64)
+        while len(frontier) and rounds < max_rounds:
+            rounds += 1
+            alive[frontier] = False
+            removed += np.bincount(member[frontier], minlength=num_clusters)
+
+            lengths, neighbors = gather_rows(graph.indptr, graph.indices, frontier)
+            neighbors = neighbors[alive[neighbors] & (member[neighbors] == np.repeat(member[frontier], lengths))]
+            np.subtract.at(degrees, neighbors, 1)
+
+            frontier = np.unique(neighbors)
+            frontier = frontier[degrees[frontier] <= level[member[frontier]]]
+        if len(frontier):
+            # (VR) Out of rounds, the clusters peeling this level are left to prune_graph
+            unresolved |= active
+            break
+
+        # (VR) The last vertex of the level was popped at size n - removed + 1
+        failed = active & (removed > 0)
+        failed[failed] = ~passes(n[failed] - removed[failed] + 1, level[failed])
+        unresolved |= failed
+        pruned |= active & (removed > 0)
+        n -= removed
+
+        # (VR) Minimum degree of what remains, the cluster is done when it fits the threshold
+        mcd = np.full(num_clusters, np.iinfo(np.int64).max)
+        np.minimum.at(mcd, member[alive], degrees[alive])
+        active &= ~failed & (n > 0)
+        active[active] = passes(n[active], mcd[active])
+
+    resolved = np.flatnonzero(pruned & ~unresolved & (n >= 2))
+    keep = alive[nodes]
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    return {
+        int(c): (np.sort(nodes[offsets[c]:offsets[c + 1]][keep[offsets[c]:offsets[c + 1]]]), int(original_mcd[c]))
+        for c in resolved
+    }
@@ -1,6 +1,11 @@
 import argparse
-import networkit as nk
-import csv
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+# (VR) Silent by default when imported, main sets it from the command line
+quiet = True
 
 
 def main(args):
@@ -11,272 +16,296 @@ def main(args):
     k = args.kvalue
     quiet = args.quiet
 
-    edge_list_reader = nk.graphio.EdgeListReader('\t',0, continuous=False, directed=True)
-    graph1 = edge_list_reader.read(edge_list)
-    node_id_map = edge_list_reader.getNodeMap()   
-    inverted_node_id_map = dict(map(reversed, node_id_map.items()))
+    edges = read_edge_list(edge_list)
+    node_ids, clusters = ikc_numbered(edges[:, 0], edges[:, 1], k, args.modularity)
+    print_clusters(clusters, out_dir, node_ids)
 
-    graph, node_id_dict = format_graph(graph1)
 
-    clusters = iterative_k_core_decomposition_MCS_ES(graph, k, node_id_dict)
-    print_clusters(clusters, out_dir, inverted_node_id_map)
+def read_edge_list(edge_list):
+    '''
+    Reads the edge list (tab or space separated) in bulk
+    OUTPUT
+    ------
+    edges : (m, 2) array of the node ids of the edges
+    '''
+    edges = pd.read_csv(edge_list, sep=r"\s+", header=None, comment="#", usecols=[0, 1], dtype=np.int64)
+    if not quiet:
+        print(len(edges), "edges")
+    return edges.to_numpy().reshape(-1, 2)
 
 
-def print_clusters(clusters, out_dir, inverted_node_id_map):
+def ikc_from_edges(src, dst, k, modularity=False):
     '''
-    This writes a csv containing lines with the:
-    node Id, cluster nbr, and value of k for which cluster nbr was generated
+    Runs IKC in process on the graph given by its edges, as if they were read from an edge list
     INPUT
     -----
-    clusters : a list of clusters represented as lists of nodes in each cluster
-    outDir : the file path and name of the ouput
+    src, dst   : arrays of the endpoints of the edges, one entry per edge
+    k          : the minimum allowed value for k for valid clusters
+    modularity : also reject the clusters whose modularity is not positive
+    OUTPUT
+    ------
+    clusters : the (cluster, k, modularity) tuples in the order they are written by main, the
+               clusters being lists of the node ids of the edges
     '''
-    # the index indicates the order for when the cluster number was generated
-    index = 0
-    k = 0
-    with open("{}".format(out_dir), "w") as output:
-        csvwriter = csv.writer(output)
-        for cluster_info in clusters:
-            (cluster, k, modularity_score) = cluster_info
+    node_ids, clusters = ikc_numbered(src, dst, k, modularity)
+    return [(node_ids[cluster].tolist(), cluster_k, modularity)
+            for cluster, cluster_k, modularity in clusters]
+
+
+def ikc_numbered(src, dst, k, modularity=False):
+    '''
+    Runs IKC on the graph given by its edges
+    OUTPUT
+    ------
+    node_ids : array of the node id of each number
+    clusters : the (cluster, k, modularity) tuples, the clusters being arrays of node numbers
+    '''
+    node_ids, local_src, local_dst = first_appearance_ids(src, dst)
+    n = len(node_ids)
+    # like the directed networkit graph of the original tool, the degrees, core numbers and modularities
+    # are computed on the distinct directed edges: a repeated edge counts once but u v and v u are two edges
+    keep = local_src != local_dst
+    directed = np.unique(local_src[keep] * n + local_dst[keep])
+    local_src, local_dst = directed // n, directed % n
+    indptr, indices, multiplicity = edges_to_csr(local_src, local_dst, n)
+    # the modularity of the nodes left unclustered is computed from their out-degree
+    out_degrees = np.bincount(local_src, minlength=n)
+    return node_ids, iterative_k_core_decomposition(
+        indptr, indices, multiplicity, k, out_degrees, len(directed), modularity)
+
+
+def first_appearance_ids(src, dst):
+    '''
+    Numbers the nodes in their order of first appearance in the edges, like a (non continuous)
+    networkit EdgeListReader
+    OUTPUT
+    ------
+    node_ids           : array of the node id of each number
+    local_src, local_dst : the edges with the node numbers
+    '''
+    endpoints = np.column_stack([np.asarray(src, dtype=np.int64), np.asarray(dst, dtype=np.int64)]).ravel()
+    ids, first, inverse = np.unique(endpoints, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty(len(ids), dtype=np.int64)
+    rank[order] = np.arange(len(ids))
+    local = rank[inverse.reshape(-1)].reshape(-1, 2)
+    return ids[order], local[:, 0], local[:, 1]
 
-            index += 1
-            # print a separate line for each node in each cluster
-            for node in cluster:
-                csvwriter.writerow([inverted_node_id_map[node], index, k, modularity_score])
+
+def edges_to_csr(src, dst, n):
+    '''
+    Symmetric CSR adjacency (sorted rows, no parallel edges) of the undirected graph of the distinct directed
+    edges (without self loops), multiplicity holding for each entry of indices the number of directed edges
+    between the two nodes
+    '''
+    keys = np.concatenate([src * n + dst, dst * n + src])
+    keys.sort()
+    first = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    multiplicity = np.diff(np.append(first, len(keys)))
+    keys = keys[first]
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // n, minlength=n), out=indptr[1:])
+    return indptr, keys % n, multiplicity
 
 
-def iterative_k_core_decomposition_MCS_ES(graph, k, inverted_orig_node_ids):
+def iterative_k_core_decomposition(indptr, indices, multiplicity, k, out_degrees, num_edges, modularity=False):
     '''
+    Array based IKC: repeatedly takes the components of the maximum core of the graph as clusters
+    and removes them, until the maximum core number is below k
+    The nodes keep their numbers throughout, and the core numbers of the nodes left are updated
+    after each removal (see update_core_numbers) instead of decomposing the graph again
     INPUT
     -----
-    graph                  : the full networkit graph
-    k                      : the minimum allowed value for k for valid clusters
-    inverted_orig_node_ids : the dictionary mapping the compacted node IDs to the original node IDs
+    indptr, indices : symmetric CSR adjacency of the graph
+    multiplicity    : number of edges behind each entry of indices (see edges_to_csr), counted in the
+                      degrees, core numbers and modularities
+    k               : the minimum allowed value for k for valid clusters
+    out_degrees     : out-degree of each node in the distinct input edges, for the modularity of the nodes left
+    num_edges       : number of distinct input edges (without self loops)
+    modularity      : also reject the clusters whose modularity is not positive
     OUTPUT
     ------
-    final_clusters : the clustering output, a list of lists with clustered nodes
+    final_clusters : the (cluster, k, modularity) tuples, the clusters being arrays of node numbers
     '''
-    orig_graph = nk.graphtools.subgraphFromNodes(graph, graph.iterNodes())
-    L = orig_graph.numberOfEdges()
+    n = len(indptr) - 1
+    alive = np.ones(n, dtype=bool)
+    member = np.zeros(n, dtype=bool)
+    position = np.zeros(n, dtype=np.int64)
+    core = core_numbers(indptr, indices, multiplicity)
     singletons = []
     final_clusters = []
+    # in + out degree of each node in the input edges
+    degrees = np.bincount(np.repeat(np.arange(n), np.diff(indptr)), weights=multiplicity, minlength=n)
 
     nbr_failed_modularity = 0
     nbr_failed_k_valid = 0
 
-    # continue finding clusters for different values of k until
-    # a. there are no nodes left in the garph or
-    # b. the maximum value of k is lower than the minumum allowed k for valid clusters
-    while graph.numberOfNodes() > 0:
-
-        # run kc on the graph to get the smallest kcore
-        subgraph, max_k, kcore = kc(graph)
-        if subgraph == None:
-            if not quiet:
-                print ("no available subgraph")
-            break
+    while alive.any():
+        max_k = int(core[alive].max())
 
-        # if b. above is true, add all singletons and nodes left in the graph as individual clusters
-        # and break
+        # add all nodes left in the graph as individual clusters once no core is large enough
         if max_k < k:
-            for node in graph.iterNodes():
-               modularity = (-1)*(orig_graph.degree(inverted_orig_node_ids[node])/(2*L))**2
-               final_clusters.append(([inverted_orig_node_ids[node]],0,modularity))
+            left = np.flatnonzero(alive)
+            modularities = (-1) * (out_degrees[left] / (2 * num_edges)) ** 2
+            final_clusters.extend((left[i:i + 1], 0, modularity) for i, modularity in enumerate(modularities.tolist()))
             for node in singletons:
-               final_clusters.append(([node],0,0))
+                final_clusters.append((np.array([node]), 0, 0))
             break
 
-        # compute the components
-        cc = nk.components.WeaklyConnectedComponents(subgraph)
-        cc.run()
-        components = cc.getComponents()
-
-        nodes_to_remove = set()
-
-        # check components to make sure they are k-valid and m-valid 
-        # then if so, add them to a cluster or break them up to make k-valid
-        # finally add them to the final_clusters and remove those nodes from the graph
-        for component in components:
-            clusters = []
-            valid_modularities = []
-
-            # ensure the component is k_valid and modular
-            # if not remode the nodes from the graph and add to the singletons
-            if k_valid(component, subgraph, k):
-                modularity = modular(component, orig_graph, inverted_orig_node_ids)
-                if modularity > 0:
-                    sub_components = [(component, modularity)]
-                else:
-                    if not quiet:
-                        print('failed modularity')
-                    nbr_failed_modularity += 1
-                    sub_components = []
-                    nodes_to_remove.update(component)
-                    singletons.extend(orig_id_component(component, inverted_orig_node_ids))
-            else:
+        # the components of the maximum core, numbered by their smallest node
+        kcore = np.flatnonzero(alive & (core == max_k))
+        if not quiet:
+            print("k value", max_k, 'nbr core members', len(kcore))
+        member[kcore] = True
+        lengths, neighbors = gather_rows(indptr, indices, kcore)
+        inside = member[neighbors]
+        member[kcore] = False
+        rows = np.repeat(np.arange(len(kcore)), lengths)
+        position[kcore] = np.arange(len(kcore))
+        local = position[neighbors[inside]]
+        adjacency = csr_matrix((np.ones(len(local), dtype=np.int8), (rows[inside], local)),
+                               shape=(len(kcore), len(kcore)))
+        nbr_components, labels = connected_components(adjacency, directed=False)
+
+        # k-valid: every node has a degree of at least k in its component, checked for all the components at once
+        _, counts = gather_rows(indptr, multiplicity, kcore)
+        core_degrees = np.bincount(rows[inside], weights=counts[inside], minlength=len(kcore))
+        min_degrees = np.full(nbr_components, np.iinfo(np.int64).max)
+        np.minimum.at(min_degrees, labels, core_degrees)
+
+        # modularity ls / L - (ds / 2L)^2 of all the components at once, from the edges inside each
+        # component (counted from both ends) and the sum of the degrees of its nodes
+        if modularity:
+            internal = np.bincount(labels[rows[inside]], weights=counts[inside], minlength=nbr_components) / 2
+            total_degrees = np.bincount(labels, weights=degrees[kcore], minlength=nbr_components)
+            modularities = (internal / num_edges - (total_degrees / (2 * num_edges)) ** 2).tolist()
+        else:
+            modularities = [1] * nbr_components
+
+        order = np.argsort(labels, kind="stable")
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=nbr_components))])
+        for c in range(nbr_components):
+            component = kcore[order[bounds[c]:bounds[c + 1]]]
+            if min_degrees[c] < k:
                 if not quiet:
                     print('failed k-valid')
                 nbr_failed_k_valid += 1
-                sub_components = []
-                nodes_to_remove.update(component)
-                singletons.extend(orig_id_component(component, inverted_orig_node_ids))
-
-            # retreive the original node ID for the clustering output and add each new component as its own cluster
-            for sub_component, modularity in sub_components:
-                nodes_to_remove.update(sub_component)
-                cluster = []
-                for node in sub_component:
-                    cluster.append(inverted_orig_node_ids[node])
+                singletons.extend(component.tolist())
+            elif modularities[c] <= 0:
                 if not quiet:
-                    print ('adding cluster length', len(cluster))
-                clusters.append((cluster, max_k, modularity))
-
-            final_clusters.extend(clusters)
-
-        # just prints information about the number of components to standard output
-        component_sizes = cc.getComponentSizes()
-        nbr_large_components = 0
-        large_components = dict()
-        for nbr,size in component_sizes.items():
-            if size > 100:
-                nbr_large_components += 1
-                large_components[nbr] = size
-        if not quiet:
-            print ('nbr components:', len(components),
-                ',  nbr components with more than 100 nodes:', nbr_large_components)
-
-        # remove nodes marked for removal 
-        # (either already clustered or when a large cluster is not validly broken up)
-        for node in nodes_to_remove:
-            graph.removeNode(node)
-            #print ("removing node: ", inverted_orig_node_ids[node])
-
-        # compact the subgraph with continuous node IDs (needed for partitioning in kc)
-        # and update inverted_orig_node_ids with the new IDs
-        node_id_dict = nk.graphtools.getContinuousNodeIds(graph)
-        inverted_node_id_dict = dict(map(reversed, node_id_dict.items()))
-        temp_dict = dict()
-        for new_id, old_id in inverted_node_id_dict.items():
-            orig_id = inverted_orig_node_ids[old_id]
-            temp_dict[new_id] = orig_id
-        inverted_orig_node_ids = temp_dict
-        graph = nk.graphtools.getCompactedGraph(graph, node_id_dict)
+                    print('failed modularity')
+                nbr_failed_modularity += 1
+                singletons.extend(component.tolist())
+            else:
+                if not quiet:
+                    print('adding cluster length', len(component))
+                final_clusters.append((component, max_k, modularities[c]))
+
+        alive[kcore] = False
+        update_core_numbers(indptr, indices, multiplicity, core, alive, kcore)
 
         if not quiet:
-            print ('nodes left in graph: ', graph.numberOfNodes())
+            print('nbr components:', nbr_components)
+            print('nodes left in graph: ', int(alive.sum()))
 
     if not quiet:
-        print ("nbr of clusters which were rejected since they were not k-valid : ", nbr_failed_k_valid)
-        print ("nbr of clusters which were rejected since they were not modular : ", nbr_failed_modularity)
+        print("nbr of clusters which were rejected since they were not k-valid : ", nbr_failed_k_valid)
+        print("nbr of clusters which were rejected since they were not modular : ", nbr_failed_modularity)
 
     return final_clusters
 
 
-def kc(graph, k=None):
+def gather_rows(indptr, indices, selection):
     '''
-    INPUT
-    -----
-    graph : networkit graph
-    k     : the minimum node degree for all nodes in the subgraph
-    OUTPUT
-    ------
-    subgraph : the subgraph containing only nodes of degree k or higher
-    max_k    : the the largest value of k for which there are still nodes remaining in the subgraph
-    kc       : the core decomposition networkit object
+    The concatenated CSR rows of the nodes in selection, with the length of each row
     '''
-
-    # get the value of k associated with each node in the graph and store in a partition
-    kc = nk.centrality.CoreDecomposition(graph, storeNodeOrder=True)
-    kc.run()
-    partition = kc.getPartition()
-
-    kcore_members = []
-    max_k = kc.maxCoreNumber()
-
-    # default to the maximum k value
-    if k == None:
-       k = max_k
-
-    save_k = k
-
-    # if the value of k is lower than the minimum allowed exit
-    if max_k < k:
-        return None, max_k, kc
-
-    # populate the kcore members with all nodes with k values between k and max_k
-    while k <= max_k:
-        kcore_members.extend(partition.getMembers(k))
-        k += 1
-
-    # return the subgraph with nodes from kcore members
-    if not quiet:
-        print ("k value", save_k,'nbr core members', len(kcore_members))
-    return nk.graphtools.subgraphFromNodes(graph, kcore_members), max_k, kc
-
-
-def k_valid(component, subgraph, k):
-    #subgraph = nk.graphtools.subgraphFromNodes(graph, component)
-    k_valid = True
-    component_nodes = set(component)
-    for node in subgraph.iterNodes():
-        if node in component_nodes:
-            if (subgraph.degreeIn(node) + subgraph.degreeOut(node)) < k:
-                #print ("node", node)
-                #print('fails k condition', subgraph.degree(node))
-                k_valid = False
-                break
-    return k_valid
-
-
-def modular(component, orig_graph, inverted_orig_node_ids):
-    POSITIVE_VALUE = 1
-    return POSITIVE_VALUE
-
-    cluster = nk.graphtools.subgraphFromNodes(orig_graph, orig_id_component(component, inverted_orig_node_ids))
-
-    l = orig_graph.numberOfEdges()
-    ls = cluster.numberOfEdges()
-    ds = 0
-
-    for node in cluster.iterNodes():
-       ds += orig_graph.degreeIn(node)
-       ds += orig_graph.degreeOut(node)
-
-    return (ls/l - (ds/(2*l))**2)
-
-
-def orig_id_component(component, inverted_orig_node_ids):
-    return [inverted_orig_node_ids[node] for node in component]
+    starts = indptr[selection]
+    lengths = indptr[selection + 1] - starts
+    offsets = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+    return lengths, indices[offsets]
 
 
-def format_graph(graph1):
-    origNodeIdDict = nk.graphtools.getContinuousNodeIds(graph1)
-    invertedOrigNodeIdDict = dict(map(reversed, origNodeIdDict.items()))
-    graph1 = nk.graphtools.getCompactedGraph(graph1, origNodeIdDict)
+def core_numbers(indptr, indices, multiplicity):
+    '''
+    Core number of every node, by peeling all the nodes of degree at most k at once for increasing k
+    The degrees count the multiplicity of the edges
+    '''
+    n = len(indptr) - 1
+    degrees = np.bincount(np.repeat(np.arange(n), np.diff(indptr)), weights=multiplicity, minlength=n).astype(np.int64)
+    core = np.zeros(len(degrees), dtype=np.int64)
+    remaining = np.ones(len(degrees), dtype=bool)
+    k = 0
+    while remaining.any():
+        k = max(k, int(degrees[remaining].min()))
+        frontier = np.flatnonzero(remaining & (degrees <= k))
+        while len(frontier):
+            remaining[frontier] = False
+            core[frontier] = k
+            _, neighbors = gather_rows(indptr, indices, frontier)
+            _, counts = gather_rows(indptr, multiplicity, frontier)
+            keep = remaining[neighbors]
+            neighbors = neighbors[keep]
+            np.subtract.at(degrees, neighbors, counts[keep])
+            frontier = np.unique(neighbors)
+            frontier = frontier[degrees[frontier] <= k]
+    return core
+
+
+def update_core_numbers(indptr, indices, multiplicity, core, alive, removed):
+    '''
+    Updates the core numbers of the nodes left after removing some nodes
+    The core numbers can only decrease, so starting from the old ones, the core number of a node
+    is lowered to the h-index of the core numbers of its neighbors (each counted with the multiplicity
+    of its edge) until nothing changes. Only the neighbors of the removed nodes, and then of the lowered
+    ones, are visited.
+    '''
+    _, neighbors = gather_rows(indptr, indices, removed)
+    frontier = np.unique(neighbors[alive[neighbors]])
+    while len(frontier):
+        lengths, neighbors = gather_rows(indptr, indices, frontier)
+        _, weights = gather_rows(indptr, multiplicity, frontier)
+        rows = np.repeat(np.arange(len(frontier)), lengths)
+        keep = alive[neighbors]
+        rows = rows[keep]
+        weights = weights[keep]
+        values = np.minimum(core[neighbors[keep]], core[frontier][rows])
+        # h-index: the largest h such that the edges to neighbors with a core number of at least h
+        # number at least h, i.e. the largest min(value, edges so far) along each row sorted by decreasing value
+        order = np.lexsort((-values, rows))
+        rows = rows[order]
+        values = values[order]
+        totals = np.concatenate([[0], np.cumsum(weights[order])])
+        counts = np.bincount(rows, minlength=len(frontier))
+        ranks = totals[1:] - np.repeat(totals[np.cumsum(counts) - counts], counts)
+        h = np.zeros(len(frontier), dtype=np.int64)
+        np.maximum.at(h, rows, np.minimum(values, ranks))
+
+        lowered = frontier[h < core[frontier]]
+        core[lowered] = h[h < core[frontier]]
+        if len(lowered) == 0:
+            break
+        _, neighbors = gather_rows(indptr, indices, lowered)
+        frontier = np.unique(neighbors[alive[neighbors]])
 
-    if graph1.isWeighted() == False:
-        if not quiet:
-            print ("not weighted")
-        weighted = nk.Graph(n=0, weighted=True, directed=True)
-
-        for node in graph1.iterNodes():
-            weighted.addNode()
-        for u, v in graph1.iterEdges():
-            if weighted.hasNode(u) == False:
-                weighted.addNode(u)
-            if weighted.hasNode(v) == False:
-                weighted.addNode(v)
-            weighted.addEdge(u, v, graph1.degreeIn(u))
-            #print (u, v, graph1.degreeIn(u))
-        graph = weighted
-    else:
-        graph = graph1
-
-    graph.removeSelfLoops()
 
-    if not quiet:
-        print (graph.numberOfNodes())
-    return graph, invertedOrigNodeIdDict
+def print_clusters(clusters, out_dir, inverted_node_id_map):
+    '''
+    This writes a csv containing lines with the:
+    node Id, cluster nbr, and value of k for which cluster nbr was generated
+    The lines of a cluster only differ by their node, so each cluster is written with one join,
+    through a large buffer
+    INPUT
+    -----
+    clusters : a list of clusters represented as arrays of node numbers in each cluster
+    outDir : the file path and name of the ouput
+    inverted_node_id_map : array of the node id of each node number
+    '''
+    # the index indicates the order for when the cluster number was generated
+    with open("{}".format(out_dir), "w", buffering=1 << 20, newline="") as output:
+        for index, (cluster, k, modularity_score) in enumerate(clusters, start=1):
+            # same lines as csv.writer
+            suffix = f",{index},{k},{modularity_score!r}\r\n"
+            output.write(suffix.join(map(str, inverted_node_id_map[cluster].tolist())) + suffix)
 
 
 def parseArgs():
@@ -294,6 +323,9 @@ def parseArgs():
                         help="non-negative integer value of the minimum required adjacent nodes for each node",
                         required=False, default=0)
     
+    parser.add_argument("-m", "--modularity", action="store_true",
+                        help="reject the clusters whose modularity is not positive")
+
     parser.add_argument("-q", "--quiet", action="store_true",
                         help="silence ikc outputs")
 
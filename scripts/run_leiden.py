@@ -27,12 +27,16 @@ if __name__ == "__main__":
         '-n', metavar='n_iterations', type=int, required=True,
         help='number of iterations'
         )
+    parser.add_argument(
+        '-s', metavar='seed', type=int, required=False, default=1234,
+        help='random seed'
+        )
     args = parser.parse_args()
 
     net = igraph.Graph.Load(args.i, format='edgelist', directed=False)
     partition = leidenalg.find_partition(
         net, leidenalg.CPMVertexPartition, resolution_parameter=args.r,
-        seed=1234, n_iterations=args.n
+        seed=args.s, n_iterations=args.n
         )
     with open(args.o, "w") as f:
         for n, m in enumerate(partition.membership):
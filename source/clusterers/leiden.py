@@ -35,14 +35,15 @@ class LeidenClustering(Clustering):
     def get_stage_commands(self, project_root, prev_file):
         resolutions = [param['res'] for param in self.params]
         iterations = [param['i'] for param in self.params]
+        seeds = [param.get('seed', 1234) for param in self.params]
         cmd = []
 
         counter = 1
-        for i, (res, niter, v) in enumerate(zip(resolutions, iterations, self.output_file)):
+        for i, (res, niter, seed, v) in enumerate(zip(resolutions, iterations, seeds, self.output_file)):
             cmd.append(f'echo "Currently on resolution {res}, running {niter} iterations"')
             output_file = v
             input_file = prev_file if type(prev_file) != dict else prev_file[i]
-            cmd.append(f'python3 {project_root}/scripts/run_leiden.py -i {input_file} -r {res} -o {output_file} -n {niter} &')
+            cmd.append(f'python3 {project_root}/scripts/run_leiden.py -i {input_file} -r {res} -o {output_file} -n {niter} -s {seed} &')
             if counter % self.parallel_limit == 0:
                 cmd.append('wait')
             counter += 1
@@ -33,14 +33,15 @@ class LeidenModClustering(Clustering):
 
     def get_stage_commands(self, project_root, prev_file):
         iterations = [param['i'] for param in self.params]
+        seeds = [param.get('seed', 1234) for param in self.params]
         cmd = []
 
         counter = 1
-        for i, (niter, v) in enumerate(zip(iterations, self.output_file)):
+        for i, (niter, seed, v) in enumerate(zip(iterations, seeds, self.output_file)):
             cmd.append(f'echo "Currently running {niter} iterations"')
             output_file = v
             input_file = prev_file if type(prev_file) != list else prev_file[i]
-            cmd.append(f'python3 {project_root}/scripts/run_leiden_mod.py -i {input_file} -o {output_file} -n {niter} &')
+            cmd.append(f'python3 {project_root}/scripts/run_leiden_mod.py -i {input_file} -o {output_file} -n {niter} -s {seed} &')
             if counter % self.parallel_limit == 0:
                 cmd.append('wait')
             counter += 1
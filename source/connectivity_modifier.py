@@ -63,8 +63,9 @@ class CM(Stage):
         cmd = []
         resolutions = [param['res'] for param in self.params]
         iterations = [param['i'] for param in self.params]
+        seeds = [param.get('seed', -1) for param in self.params]
 
-        for i, (res, niter, output_file) in enumerate(zip(resolutions, iterations, self.output_file)):
+        for i, (res, niter, seed, output_file) in enumerate(zip(resolutions, iterations, seeds, self.output_file)):
             cmd.append(f'echo "Currently on resolution {res}, running {niter} iterations"')
 
             c = f'{project_root}/hm01/tests/mp-memprofile/profiler.sh ' if self.memprof else ''
@@ -77,6 +78,8 @@ class CM(Stage):
 
             if self.algorithm == 'leiden':
                 c = c + f'-g {res}'
+
+            c = c + f' --n_iterations {niter} --seed {seed}'
             
             cmd.append(c)
 
@@ -97,8 +100,9 @@ class CM(Stage):
     def stage_commands_leidenmod(self, project_root):
         cmd = []
         iterations = [param['i'] for param in self.params]
+        seeds = [param.get('seed', -1) for param in self.params]
 
-        for i, (niter, output_file) in enumerate(zip(iterations, self.output_file)):
+        for i, (niter, seed, output_file) in enumerate(zip(iterations, seeds, self.output_file)):
             cmd.append(f'echo "Currently running {niter} iterations"')
 
             c = f'{project_root}/hm01/tests/mp-memprofile/profiler.sh ' if self.memprof else ''
@@ -108,6 +112,8 @@ class CM(Stage):
                     -e {self.get_previous_file()[i]} \
                         -o {output_file} \
                             -c {self.algorithm} {self.args}'
+
+            c = c + f' --n_iterations {niter} --seed {seed}'
             
             cmd.append(c)
 
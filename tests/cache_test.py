@@ -0,0 +1,47 @@
+import pickle
+
+from hm01.cache import ResultCache
+from hm01.mincut import CutResult
+from mincut_test import realized
+
+
+def test_result_cache(tmp_path):
+    cache = ResultCache(str(tmp_path), 1 << 20, 'graph')
+    path = realized([(0, 1), (1, 2)], index='a')
+    key = cache.key('mincut', '', path)
+    assert cache.get(key) is None
+
+    cache.put(key, CutResult([10], [13, 16], 1, 'tree'))
+    res = cache.get(key)
+    assert res == ([10], [13, 16], 1) and res.algorithm == 'tree'
+
+    # keyed by the node set, whatever the name of the cluster and the order of its edges
+    assert cache.key('mincut', '', realized([(2, 1), (0, 1)], index='b')) == key
+    assert cache.key('mincut', '', realized([(0, 1), (1, 3)], index='a')) != key
+    assert cache.key('recluster', '', path) != key
+    assert cache.key('mincut', '0.5', path) != key
+    assert ResultCache(str(tmp_path), 1 << 20, 'other graph').key('mincut', '', path) != key
+
+    # the workers get the cache without its connection, and open their own on the same store
+    copy = pickle.loads(pickle.dumps(cache))
+    assert copy._conn is None
+    assert copy.get(key) == res
+
+
+def test_result_cache_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path), 4000, 'graph')
+    keys = [cache.key('mincut', str(i), realized([(0, 1)])) for i in range(20)]
+    for key in keys:
+        cache.put(key, bytes(300))
+    # the first entry is the most recently used one
+    assert cache.get(keys[0]) is not None
+    cache.evict()
+    size = cache.conn.execute('SELECT SUM(size) FROM entries').fetchone()[0]
+    assert size <= 4000
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[-1]) is not None
+
+    # a result larger than the store is not kept
+    cache.put(keys[1], bytes(5000))
+    assert cache.get(keys[1]) is None
@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from hm01.checkpoint import Checkpointer
+from hm01.context import context
+
+
+def test_checkpointer(tmp_path, monkeypatch):
+    monkeypatch.setitem(context.__dict__, 'working_dir', str(tmp_path))
+    meta = {'threshold': '1log10', 'num_clusters': 3}
+
+    checkpoint = Checkpointer('checkpoints', 3600, meta)
+    assert checkpoint.start(resume=True) == []
+    checkpoint.record('a')
+    checkpoint.record('b')
+    checkpoint.flush()
+    checkpoint.record('c')
+    checkpoint.close()
+    assert len(context.find_checkpoints('checkpoints')) == 3
+
+    # a resumed run replays the results and numbers its own checkpoints after them
+    checkpoint = Checkpointer('checkpoints', 3600, meta)
+    assert checkpoint.start(resume=True) == ['a', 'b', 'c']
+    checkpoint.record('d')
+    checkpoint.close()
+    assert Checkpointer('checkpoints', 3600, meta).start(resume=True) == ['a', 'b', 'c', 'd']
+
+    with pytest.raises(AssertionError):
+        Checkpointer('checkpoints', 3600, dict(meta, threshold='2')).start(resume=True)
+
+    # a new run starts over
+    assert Checkpointer('checkpoints', 3600, meta).start(resume=False) == []
+    assert len(context.find_checkpoints('checkpoints')) == 1
+    assert not list(tmp_path.glob('checkpoints/*.tmp'))
+
+
+def test_resume(tmp_path):
+    dataset = Path(Path(__file__).parent, 'multi_component_test')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [str(Path(__file__).parents[1]), os.environ.get('PYTHONPATH', '')]))
+
+    def run_cm(output, *args, check=True):
+        return subprocess.run([
+            sys.executable, '-m', 'hm01.cm',
+            '-i', str(dataset / 'network.tsv'), '-e', str(dataset / 'clustering.tsv'),
+            '-c', 'leiden', '-g', '0.5', '-t', '1log10', '-n', '2', '-q',
+            '--checkpoint_interval', '0.000001', '-o', str(tmp_path / output), *args,
+        ], cwd=tmp_path, env=env, check=check, capture_output=not check)
+
+    # a checkpoint for every result, then the run is cut short after the first two
+    run_cm('full.tsv')
+    checkpoints = sorted(tmp_path.glob('network.tsv_working_dir/checkpoints_1log10/*.pkl'))
+    assert len(checkpoints) > 3
+    for path in checkpoints[3:]:
+        path.unlink()
+    written = [path.stat().st_mtime_ns for path in checkpoints[:3]]
+
+    run_cm('resumed.tsv', '--resume')
+    # the results kept are replayed, not computed again
+    assert [path.stat().st_mtime_ns for path in checkpoints[:3]] == written
+    assert (tmp_path / 'resumed.tsv').read_text() == (tmp_path / 'full.tsv').read_text()
+    assert (tmp_path / 'resumed.tsv.tree.json').read_text() == (tmp_path / 'full.tsv.tree.json').read_text()
+
+    # not with other options
+    for option in ['--split_bridges', '--all_mincuts', '--certificate', '--preprune']:
+        assert run_cm('other.tsv', '--resume', option, check=False).returncode != 0
+    assert run_cm('other.tsv', '--resume', '--mincut_algorithm', 'auto', check=False).returncode != 0
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# a 5-clique, a 4-clique and a 5-clique, joined by two bridges
+CLIQUES = [range(5), range(5, 9), range(9, 14)]
+EDGES = [(u, v) for clique in CLIQUES for u in clique for v in clique if u < v] + [(4, 5), (8, 9)]
+
+
+def run_cm(tmp_path, threshold, *args):
+    ''' The clusters found by CM on the cliques, as a set of frozensets of nodes '''
+    network = tmp_path / 'network.tsv'
+    network.write_text(''.join(f'{u}\t{v}\n' for u, v in EDGES))
+    clustering = tmp_path / 'clustering.tsv'
+    clustering.write_text(''.join(f'{u}\t1\n' for u in range(14)))
+    output = tmp_path / 'output.tsv'
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [str(Path(__file__).parents[1]), os.environ.get('PYTHONPATH', '')]))
+    subprocess.run([
+        sys.executable, '-m', 'hm01.cm', '-i', str(network), '-e', str(clustering),
+        '-c', 'leiden', '-g', '0.01', '-t', threshold, '-n', '1', '-q', '-o', str(output), *args,
+    ], cwd=tmp_path, env=env, check=True)
+    clusters = {}
+    for line in output.read_text().splitlines():
+        node, cluster = line.split()
+        clusters.setdefault(cluster, set()).add(int(node))
+    return {frozenset(nodes) for nodes in clusters.values()}
+
+
+def test_split_bridges(tmp_path):
+    # with 1log10, the 9 nodes left after cutting off a 5-clique are well-connected
+    clusters = run_cm(tmp_path, '1log10')
+    assert sorted(map(len, clusters)) == [5, 9]
+    assert run_cm(tmp_path, '1log10', '--split_bridges') == clusters
+
+    clusters = run_cm(tmp_path, '2')
+    assert clusters == {frozenset(clique) for clique in CLIQUES}
+    assert run_cm(tmp_path, '2', '--split_bridges') == clusters
+
+
+def test_all_mincuts(tmp_path):
+    clusters = run_cm(tmp_path, '1log10')
+    assert run_cm(tmp_path, '1log10', '--all_mincuts') == clusters
+    assert run_cm(tmp_path, '2', '--all_mincuts') == run_cm(tmp_path, '2')
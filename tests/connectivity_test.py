@@ -0,0 +1,76 @@
+import random
+
+import numpy as np
+
+import hm01.mincut as mincut
+from hm01.connectivity import minimum_cut_atoms, two_edge_connected_components
+from mincut_test import minimum_cuts, realized
+
+
+def components(nodes, edges):
+    ''' The connected components, as a set of frozensets of nodes '''
+    parent = {u: u for u in nodes}
+
+    def find(u):
+        while parent[u] != u:
+            u = parent[u]
+        return u
+
+    for u, v in edges:
+        parent[find(u)] = find(v)
+    groups = {}
+    for u in nodes:
+        groups.setdefault(find(u), set()).add(u)
+    return {frozenset(group) for group in groups.values()}
+
+
+def parts(graph, count, labels):
+    assert sorted(np.bincount(labels, minlength=count)) == np.bincount(labels, minlength=count).tolist()
+    hydrator = np.asarray(graph.hydrator)
+    return {frozenset(hydrator[labels == i].tolist()) for i in range(count)}
+
+
+def test_two_edge_connected_components():
+    rng = random.Random(2)
+    for _ in range(100):
+        n = rng.randint(1, 14)
+        pairs = [(u, v) for u in range(n) for v in range(u)]
+        edges = rng.sample(pairs, rng.randint(0, min(len(pairs), 2 * n)))
+        graph = realized(edges, nodes=range(n))
+        nodes = list(graph.nodes())
+        edges = [(u, v) for u in nodes for v in graph.neighbors(u) if u < v]
+
+        # a bridge is an edge whose removal adds a component
+        count = len(components(nodes, edges))
+        bridges = [edge for edge in edges if len(components(nodes, [e for e in edges if e != edge])) > count]
+        expected = components(nodes, [edge for edge in edges if edge not in bridges])
+
+        assert parts(graph, *two_edge_connected_components(graph)) == expected
+
+
+def test_minimum_cut_atoms(monkeypatch):
+    # small clusters are cut in process
+    monkeypatch.setattr(mincut.config, 'algorithm', 'auto')
+
+    # every vertex of a cycle is split off, two cliques joined by two edges are split in two
+    for n in range(3, 9):
+        cycle = realized([(i, (i + 1) % n) for i in range(n)])
+        assert minimum_cut_atoms(cycle, mincut.viecut(cycle))[0] == n
+    cliques = realized([(u, v) for block in (range(4), range(4, 8)) for u in block for v in block if u < v] + [(0, 4), (1, 5)])
+    assert parts(cliques, *minimum_cut_atoms(cliques, mincut.viecut(cliques))) == {
+        frozenset([10, 13, 16, 19]), frozenset([22, 25, 28, 31])}
+
+    # any two parts are separated by a minimum cut of the graph
+    rng = random.Random(4)
+    for _ in range(40):
+        n = rng.randint(3, 10)
+        pairs = [(u, v) for u in range(n) for v in range(u)]
+        graph = realized(rng.sample(pairs, rng.randint(n - 1, len(pairs))), nodes=range(n))
+        cut_result = mincut.viecut(graph)
+        atoms = parts(graph, *minimum_cut_atoms(graph, cut_result))
+        assert set().union(*atoms) == set(graph.nodes())
+        cuts, best = minimum_cuts(graph)
+        assert best == cut_result[-1]
+        for a in atoms:
+            for b in atoms - {a}:
+                assert any(a <= side and not b & side or b <= side and not a & side for side in cuts)
@@ -1,6 +1,10 @@
+import random
 from pathlib import Path
 
-from hm01.graph import Graph, RealizedSubgraph, IntangibleSubgraph
+import numpy as np
+
+import hm01.graph as graph_module
+from hm01.graph import CSRGraph, Graph, RealizedSubgraph, IntangibleSubgraph
 
 
 def test_cgraph():
@@ -32,3 +36,21 @@ def test_cgraph():
     assert light.n() == 3
     assert heavy.m() == 9
     assert heavy.n() == 8
+
+
+def test_small_subgraphs(monkeypatch):
+    # the plain list path for small subgraphs builds the same local CSR as the array one
+    rng = random.Random(4)
+    for _ in range(100):
+        n = rng.randint(2, 40)
+        pairs = [(u, v) for u in range(n) for v in range(u)]
+        graph = CSRGraph.from_edge_array(np.array(rng.sample(pairs, rng.randint(1, min(len(pairs), 3 * n)))), n)
+        parent = IntangibleSubgraph(rng.sample(range(n), rng.randint(1, n)), 'p').realize(graph)
+        for source in (graph, parent):
+            subset = rng.sample(list(source.nodes()), rng.randint(1, source.n()))
+            realized = []
+            for small in (0, n):
+                monkeypatch.setattr(graph_module, 'SMALL_SUBGRAPH', small)
+                subgraph = IntangibleSubgraph(subset, 's').realize(source)
+                realized.append((subgraph._ids.tolist(), subgraph._indptr.tolist(), subgraph._indices.tolist()))
+            assert realized[0] == realized[1]
@@ -0,0 +1,68 @@
+import csv
+import random
+from argparse import Namespace
+
+import numpy as np
+
+from hm01.tools.ikc import core_numbers, edges_to_csr, main, update_core_numbers
+
+# a triangle given in both directions, a repeated edge and a self loop
+EDGES = '1\t2\n2\t1\n2\t3\n3\t2\n1\t3\n3\t1\n4\t1\n4\t1\n4\t5\n5\t5\n'
+# the same triangle joined to a triangle with a reciprocal and a repeated edge, then a path
+EDGES2 = '1\t2\n2\t1\n2\t3\n3\t2\n1\t3\n3\t1\n3\t4\n4\t5\n5\t6\n6\t4\n5\t4\n4\t5\n6\t7\n7\t8\n7\t8\n8\t8\n'
+
+
+def run_ikc(tmp_path, edges, k, modularity=False):
+    edge_list = tmp_path / 'network.tsv'
+    edge_list.write_text(edges)
+    output = tmp_path / 'ikc.csv'
+    main(Namespace(edgeList=str(edge_list), outDir=str(output), kvalue=k,
+                   modularity=modularity, quiet=True))
+    with open(output, newline='') as f:
+        return list(csv.reader(f))
+
+
+def test_ikc_degrees_like_baseline(tmp_path):
+    # as in the networkit version, u v and v u are two edges but a repeated line is one
+    clusters = [row[:3] for row in run_ikc(tmp_path, EDGES, 3)]
+    assert clusters == [['1', '1', '4'], ['2', '1', '4'], ['3', '1', '4'],
+                        ['4', '2', '0'], ['5', '3', '0']]
+
+    clusters = [row[:3] for row in run_ikc(tmp_path, EDGES, 0)]
+    assert clusters == [['1', '1', '4'], ['2', '1', '4'], ['3', '1', '4'],
+                        ['4', '2', '1'], ['5', '2', '1']]
+
+
+def test_ikc_modularity_like_baseline(tmp_path):
+    # lines written by the networkit version (with modular() computing the modularity for -m)
+    singletons = [['4', '2', '0', '-0.0014792899408284025'], ['5', '3', '0', '-0.00591715976331361'],
+                  ['6', '4', '0', '-0.00591715976331361'], ['7', '5', '0', '-0.0014792899408284025'],
+                  ['8', '6', '0', '-0.0']]
+    assert run_ikc(tmp_path, EDGES2, 3) == [['1', '1', '4', '1'], ['2', '1', '4', '1'], ['3', '1', '4', '1']] + singletons
+    assert run_ikc(tmp_path, EDGES2, 3, modularity=True) == [
+        ['1', '1', '4', '0.21153846153846156'], ['2', '1', '4', '0.21153846153846156'],
+        ['3', '1', '4', '0.21153846153846156']] + singletons
+    assert run_ikc(tmp_path, EDGES2, 2, modularity=True) == [
+        ['1', '1', '4', '0.21153846153846156'], ['2', '1', '4', '0.21153846153846156'],
+        ['3', '1', '4', '0.21153846153846156'], ['4', '2', '2', '0.15976331360946747'],
+        ['5', '2', '2', '0.15976331360946747'], ['6', '2', '2', '0.15976331360946747'],
+        ['7', '3', '0', '-0.0014792899408284025'], ['8', '4', '0', '-0.0']]
+
+
+def test_update_core_numbers():
+    rng = random.Random(7)
+    for _ in range(50):
+        n = rng.randint(2, 40)
+        edges = np.array([(rng.randrange(n), rng.randrange(n)) for _ in range(rng.randint(1, 4 * n))])
+        edges = np.unique(edges[edges[:, 0] != edges[:, 1]], axis=0).reshape(-1, 2)
+        indptr, indices, multiplicity = edges_to_csr(edges[:, 0], edges[:, 1], n)
+        core = core_numbers(indptr, indices, multiplicity)
+        alive = np.ones(n, dtype=bool)
+        while alive.any():
+            removed = np.array(rng.sample(np.flatnonzero(alive).tolist(), rng.randint(1, int(alive.sum()))))
+            alive[removed] = False
+            update_core_numbers(indptr, indices, multiplicity, core, alive, removed)
+            # the core numbers of the graph without the edges of the removed nodes
+            rows = np.repeat(np.arange(n), np.diff(indptr))
+            expected = core_numbers(indptr, indices, multiplicity * (alive[rows] & alive[indices]))
+            assert core[alive].tolist() == expected[alive].tolist()
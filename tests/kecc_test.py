@@ -0,0 +1,71 @@
+import random
+from itertools import combinations
+
+import hm01.mincut as mincut
+from hm01.kecc import k_edge_connected_components
+from mincut_test import realized
+
+
+def edge_connectivity(adjacency, subset):
+    ''' Mincut of the subgraph induced by the nodes of the bitmask subset, by enumeration '''
+    first, *rest = [u for u in range(len(adjacency)) if subset >> u & 1]
+    best = None
+    for r in range(len(rest)):
+        for side in combinations(rest, r):
+            mask = (1 << first) | sum(1 << u for u in side)
+            cut = sum(bin(adjacency[u] & subset & ~mask).count('1') for u in [first, *side])
+            best = cut if best is None else min(best, cut)
+    return best
+
+
+def maximal_k_edge_connected_subgraphs(n, edges, k):
+    adjacency = [0] * n
+    for u, v in edges:
+        adjacency[u] |= 1 << v
+        adjacency[v] |= 1 << u
+    found = []
+    for subset in sorted(range(1 << n), key=lambda s: -bin(s).count('1')):
+        if bin(subset).count('1') < 2 or any(subset & ~other == 0 for other, _ in found):
+            continue
+        connectivity = edge_connectivity(adjacency, subset)
+        if connectivity >= k:
+            found.append((subset, connectivity))
+    return {(frozenset(3 * u + 10 for u in range(n) if subset >> u & 1), c) for subset, c in found}
+
+
+def test_k_edge_connected_components(monkeypatch):
+    # small clusters are cut in process
+    monkeypatch.setattr(mincut.config, 'algorithm', 'auto')
+    rng = random.Random(3)
+    for i in range(60):
+        n = rng.randint(2, 10)
+        pairs = [(u, v) for u in range(n) for v in range(u)]
+        if i % 2:
+            edges = rng.sample(pairs, rng.randint(1, len(pairs)))
+        else:
+            # dense blocks joined by a few edges
+            block = [rng.randrange(3) for _ in range(n)]
+            edges = [(u, v) for u, v in pairs if rng.random() < (0.8 if block[u] == block[v] else 0.15)] or pairs[:1]
+        for k in (1, 2, 3):
+            graph = realized(edges, nodes=range(n))
+            pieces, _ = k_edge_connected_components(graph, k)
+            found = {(frozenset(piece.nodes()), cut) for piece, cut in pieces}
+            assert found == maximal_k_edge_connected_subgraphs(n, edges, k)
+            assert [piece.n() for piece, _ in pieces] == sorted(piece.n() for piece, _ in pieces)
+
+
+def test_k_edge_connected_components_blocks(monkeypatch):
+    monkeypatch.setattr(mincut.config, 'algorithm', 'auto')
+    # two 5-cliques joined by two edges, a triangle hanging from one of them and a path
+    edges = [(u, v) for block in (range(5), range(5, 10)) for u in block for v in block if u < v]
+    edges += [(0, 5), (1, 6), (2, 10), (10, 11), (11, 12), (12, 10), (12, 13), (13, 14)]
+    ids = lambda nodes: frozenset(3 * u + 10 for u in nodes)
+
+    pieces, top_cut = k_edge_connected_components(realized(edges, index='a'), 2)
+    assert [(ids(range(10, 13)), 2), (ids(range(10)), 2)] == [(frozenset(p.nodes()), c) for p, c in pieces]
+    assert [p.index for p, _ in pieces] == ['aa', 'ab']
+    assert top_cut == 1
+
+    pieces, top_cut = k_edge_connected_components(realized(edges, index='a'), 3)
+    assert {(ids(range(5)), 4), (ids(range(5, 10)), 4)} == {(frozenset(p.nodes()), c) for p, c in pieces}
+    assert top_cut == 2
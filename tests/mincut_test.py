@@ -0,0 +1,91 @@
+import random
+from itertools import combinations
+
+from hm01.graph import RealizedSubgraph
+from hm01.mincut import STOER_WAGNER, closed_form_mincut, stoer_wagner_batch
+
+
+def realized(edges, nodes=(), index='a'):
+    ''' Realized subgraph of the edges, the node ids being spread out so that they are not compact '''
+    nodes = {u for edge in edges for u in edge} | set(nodes)
+    adjacency = {3 * u + 10: [] for u in nodes}
+    for u, v in edges:
+        adjacency[3 * u + 10].append(3 * v + 10)
+        adjacency[3 * v + 10].append(3 * u + 10)
+    return RealizedSubgraph.from_adjlist(adjacency.keys(), adjacency, index)
+
+
+def cut_size(graph, side):
+    side = set(side)
+    return sum((u in side) != (v in side) for u in graph.nodes() for v in graph.neighbors(u)) // 2
+
+
+def minimum_cuts(graph):
+    ''' All the minimum cuts (as the side without the first node) and their size, by enumeration '''
+    first, *rest = graph.nodes()
+    cuts = [set(rest) - set(side) for r in range(len(rest)) for side in combinations(rest, r)]
+    best = min(cut_size(graph, side) for side in cuts)
+    return [side for side in cuts if cut_size(graph, side) == best], best
+
+
+def check_cut(graph, res):
+    light, heavy, size = res
+    assert sorted(light + heavy) == sorted(graph.nodes())
+    assert 0 < len(light) <= len(heavy)
+    assert cut_size(graph, light) == size
+    cuts, best = minimum_cuts(graph)
+    assert size == best
+    return cuts
+
+
+def random_tree(n, rng):
+    return [(v, rng.randrange(v)) for v in range(1, n)]
+
+
+def test_closed_form_mincut_shapes():
+    rng = random.Random(0)
+    for n in range(3, 11):
+        # trees and cycles are cut at the most balanced of their mincuts
+        tree = realized(random_tree(n, rng))
+        res = closed_form_mincut(tree)
+        assert res.algorithm == 'tree'
+        cuts = check_cut(tree, res)
+        assert len(res[0]) == max(min(len(side), n - len(side)) for side in cuts)
+
+        order = rng.sample(range(n), n)
+        cycle = realized([(order[i], order[i - 1]) for i in range(n)])
+        res = closed_form_mincut(cycle)
+        assert res.algorithm in ('cycle', 'min_degree')
+        check_cut(cycle, res)
+        assert res.algorithm == 'min_degree' or len(res[0]) == n // 2
+
+        # dense graphs are cut around a vertex of minimum degree
+        clique = [(u, v) for u in range(n) for v in range(u)]
+        dense = realized(rng.sample(clique, len(clique) - n // 4))
+        if 2 * dense.mcd() > dense.n():
+            res = closed_form_mincut(dense)
+            assert res.algorithm == 'min_degree'
+            check_cut(dense, res)
+
+
+def test_closed_form_mincut_other_shapes():
+    assert closed_form_mincut(realized([(0, 1)])) is None
+    # as many edges as a tree or a cycle, but disconnected
+    assert closed_form_mincut(realized([(0, 1), (1, 2), (2, 0), (3, 4)])) is None
+    assert closed_form_mincut(realized([(0, 1), (1, 2), (2, 0), (3, 4), (4, 5), (5, 3)])) is None
+    # a cycle with a chord, sparse enough that the minimum degree says nothing
+    assert closed_form_mincut(realized([(i, (i + 1) % 8) for i in range(8)] + [(0, 4)])) is None
+
+
+def test_stoer_wagner_batch():
+    rng = random.Random(1)
+    graphs = []
+    for n in rng.choices(range(2, 11), k=40):
+        pairs = [(u, v) for u in range(n) for v in range(u)]
+        # connected or not, from sparse to dense, padded to the largest graph of the batch
+        graphs.append(realized(rng.sample(pairs, rng.randint(1, len(pairs))), nodes=range(n)))
+    results = stoer_wagner_batch(graphs)
+    assert len(results) == len(graphs)
+    for graph, res in zip(graphs, results):
+        assert res.algorithm == STOER_WAGNER
+        check_cut(graph, res)
@@ -0,0 +1,100 @@
+import heapq
+import random
+from itertools import count
+
+import numpy as np
+
+from hm01.clusterers.ikc_wrapper import IkcClusterer
+from hm01.graph import CSRGraph, IntangibleSubgraph, RealizedSubgraph
+from hm01.mincut_requirement import MincutRequirement
+from hm01.pruner import prune_clusters, prune_graph
+from mincut_test import realized
+
+REQUIREMENTS = ['2', '1mcd', '0.5mcd+1', '1log10', '2log10+1', '1log10+0.5mcd', '0.5k+1']
+
+
+def heap_prune(graph, requirement, clusterer, rng=None):
+    ''' The loop of the original prune_graph over a heap, popping the vertices of equal degree in random
+    order, or without rng the most recently updated first like the bucket queue '''
+    if graph.mcd() > requirement.validity_threshold(clusterer, graph):
+        return 0
+    degrees = {u: graph.degree(u) for u in graph.nodes()}
+    heap = []
+    stamps = count()
+
+    def push(u):
+        heapq.heappush(heap, (degrees[u], rng.random() if rng else -next(stamps), u))
+
+    for u in degrees:
+        push(u)
+    deleted = 0
+    while heap:
+        degree, _, node = heapq.heappop(heap)
+        if degrees.get(node) != degree:
+            continue
+        if degree > requirement.validity_threshold(clusterer, graph, mcd_override=degree):
+            break
+        del degrees[node]
+        for neighbor in graph.neighbors(node):
+            if neighbor in degrees:
+                degrees[neighbor] -= 1
+                push(neighbor)
+        graph.remove_node(node)
+        deleted += 1
+    return deleted
+
+
+def random_graph(rng):
+    n = rng.randint(1, 30)
+    pairs = [(u, v) for u in range(n) for v in range(u)]
+    return rng.sample(pairs, rng.randint(0, min(len(pairs), 3 * n))), n
+
+
+def test_prune_graph_like_heap():
+    rng = random.Random(5)
+    clusterer = IkcClusterer(2)
+    for _ in range(300):
+        edges, n = random_graph(rng)
+        requirement = MincutRequirement.try_from_str(rng.choice(REQUIREMENTS))
+        bucket = realized(edges, nodes=range(n))
+        heap = realized(edges, nodes=range(n))
+        assert prune_graph(bucket, requirement, clusterer) == heap_prune(heap, requirement, clusterer)
+        assert sorted(bucket.nodes()) == sorted(heap.nodes())
+        assert bucket.m() == heap.m()
+
+        # the vertices removed among those of equal degree depend on the order they are popped in, unless
+        # the threshold does not depend on the size (the graph is then pruned to a core)
+        if requirement.log10 == 0:
+            heap = realized(edges, nodes=range(n))
+            assert heap_prune(heap, requirement, clusterer, rng) == n - bucket.n()
+            assert sorted(bucket.nodes()) == sorted(heap.nodes())
+
+
+def test_prune_clusters_like_prune_graph():
+    rng = random.Random(6)
+    clusterer = IkcClusterer(2)
+    resolved = 0
+    for _ in range(120):
+        n = rng.randint(20, 80)
+        pairs = [(u, v) for u in range(n) for v in range(u)]
+        graph = CSRGraph.from_edge_array(np.array(rng.sample(pairs, rng.randint(n, 4 * n))), n)
+        labels = [rng.randrange(n // 8) for _ in range(n)]
+        clusters = [IntangibleSubgraph([u for u in range(n) if labels[u] == c], str(c)) for c in range(n // 8)]
+        clusters = [cluster for cluster in clusters if cluster.subset]
+        # a node in two clusters leaves both to prune_graph
+        clusters.append(IntangibleSubgraph(clusters[0].subset[:1] + clusters[1].subset[:2], 'overlap'))
+        requirement = MincutRequirement.try_from_str(rng.choice(REQUIREMENTS))
+
+        pruned = prune_clusters(graph, clusters, requirement, clusterer)
+        assert not {0, 1, len(clusters) - 1} & set(pruned)
+        for i, cluster in enumerate(clusters):
+            subgraph = RealizedSubgraph(cluster, graph)
+            mcd = subgraph.mcd()
+            prune_graph(subgraph, requirement, clusterer)
+            # the clusters left out are not pruned, or left to prune_graph (overlapping, or with ties on log10)
+            if i in pruned:
+                kept, original_mcd = pruned[i]
+                assert kept.tolist() == sorted(subgraph.nodes())
+                assert original_mcd == mcd
+                resolved += 1
+    assert resolved > 50